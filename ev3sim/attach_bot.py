@@ -1,31 +1,64 @@
 import multiprocessing
 import importlib
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager, nullcontext
 from os import getcwd
 from queue import Empty, Queue as NonMultiQueue
 import sys
-from time import sleep
+from time import process_time, sleep
 from unittest import mock
 from ev3sim.constants import *
+from ev3sim.utils import wait_for_queues
 from ev3dev2 import Device, DeviceNotFound
 
 cur_events = NonMultiQueue()
 tick = 0
 tick_rate = 30
+received_tick = False
+# How many messages the simulator has sent that we've read, and whether our lockstep turn is over.
+messages_read = 0
+turn_over = False
 current_data = {}
+# Device names in current_data by class and address, built the first time a device is looked up each tick.
+device_index = None
 last_checked_tick = -1
-communications_messages = NonMultiQueue()
+# Messages about an open connection are kept by the connection's index, others by the address they concern.
+communications_messages = defaultdict(deque)
 input_messages = NonMultiQueue()
+# Whether this bot has a process to itself. Bots run on a thread of the simulator share its modules, so can't take over
+# __main__, and have their patches applied by ev3sim.simulation.bot_thread instead.
+OWNS_PROCESS = True
 
 
 def safe_patch(mname, cname, obj):
     try:
         getattr(importlib.import_module(mname), cname.split(".", 1)[0])
     except Exception as e:
-        return lambda f: f
+        return nullcontext()
     return mock.patch(f"{mname}.{cname}", obj)
 
 
-def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_internal, rq, rq_internal, sq, sq_internal):
+@contextmanager
+def apply_patches(patches, stubbed_modules):
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(sys.modules, stubbed_modules))
+        for mname, cname, obj in patches:
+            stack.enter_context(safe_patch(mname, cname, obj))
+        yield
+
+
+def attach_bot(
+    robot_id,
+    filename,
+    fake_roots,
+    result_queue,
+    result_queue_internal,
+    rq,
+    rq_internal,
+    sq,
+    sq_internal,
+    cache_dir=None,
+):
     result_queue._internal_size = result_queue_internal
     rq._internal_size = rq_internal
     sq._internal_size = sq_internal
@@ -62,17 +95,17 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                 )
             )
 
-        @mock.patch("builtins.print", print_mock)
-        @mock.patch("ev3sim.code_helpers.format_print", format_print_mock)
         def run_code(fname, fake_roots, recv_q: multiprocessing.Queue, send_q: multiprocessing.Queue):
             ### TIMING FUNCTIONS
 
             def handle_recv(msg_type, msg):
-                global tick, tick_rate, current_data, cur_events
+                global tick, tick_rate, current_data, device_index, cur_events, received_tick
                 if msg_type == SIM_DATA:
                     tick = msg["tick"]
+                    received_tick = True
                     tick_rate = msg["tick_rate"]
                     current_data = msg["data"]
+                    device_index = None
                     if isinstance(current_data, str):
                         # Not pretty but it works.
                         e = Exception(current_data)
@@ -82,25 +115,55 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                     return msg_type, msg
                 elif msg_type == SIM_INPUT:
                     input_messages.put((msg_type, msg))
+                elif msg_type in (RECV_DATA, SEND_SUCCESS, CLIENT_CLOSED):
+                    communications_messages[(msg_type, msg["connection"])].append(msg)
                 else:
-                    communications_messages.put((msg_type, msg))
+                    communications_messages[(msg_type, msg["connection_string"])].append(msg)
 
             def wait_for_tick():
+                global messages_read, turn_over
+                reported = False
                 recved = 0
-                msg_type = -1
-                msg = {}
                 while True:
                     try:
                         msg_type, msg = recv_q.get_nowait()
-                        handle_recv(msg_type, msg)
-                        if msg_type != SIM_DATA:
-                            break
-                        recved += 1
                     except Empty:
                         # Once we've exhausted the queue, and all of our information has been used, break and deal with the latest msg.
                         if recved > 0 and send_q.qsize() == 0:
                             break
-                        sleep_builtin(0.01)
+                        if recved > 0 or (not reported and send_q.qsize() > 0):
+                            # The simulator handles writes as they arrive, so this shouldn't take long.
+                            sleep_builtin(0.001)
+                            continue
+                        if received_tick and not reported and not turn_over:
+                            # Nothing is left to do this tick. Let the simulator know, with how much CPU it took, and
+                            # how much we've read, so it can tell if anything it has sent since would wake us.
+                            send_q.put(
+                                (
+                                    TICK_FINISHED,
+                                    {
+                                        "robot_id": robot_id,
+                                        "tick": tick,
+                                        "cpu_time": process_time(),
+                                        "read": messages_read,
+                                    },
+                                )
+                            )
+                            reported = True
+                        # Wake up as soon as the next tick arrives.
+                        wait_for_queues([recv_q], 0.01)
+                        continue
+                    messages_read += 1
+                    if msg_type == TURN_OVER:
+                        # In lockstep, anything else we are sent is kept until our next turn.
+                        turn_over = True
+                        continue
+                    handle_recv(msg_type, msg)
+                    if msg_type == SIM_DATA:
+                        turn_over = False
+                        recved += 1
+                    elif not turn_over:
+                        break
 
             def get_time():
                 return tick / tick_rate
@@ -113,17 +176,11 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                         return
                     wait_for_tick()
 
-            def wait_for_msg_of_type(MSG_TYPE):
-                while True:
-                    try:
-                        msg_type, msg = communications_messages.get_nowait()
-                        if msg_type != MSG_TYPE:
-                            communications_messages.put((msg_type, msg))
-                            wait_for_tick()
-                        else:
-                            return msg
-                    except Empty:
-                        wait_for_tick()
+            def wait_for_msg_of_type(MSG_TYPE, key):
+                mailbox = communications_messages[(MSG_TYPE, key)]
+                while not mailbox:
+                    wait_for_tick()
+                return mailbox.popleft()
 
             def fake_input(message=None):
                 sq.put(
@@ -144,10 +201,11 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
 
             ### COMMUNICATIONS
             class MockedCommSocket:
-                def __init__(self, hostaddr, port, sender_id):
+                def __init__(self, hostaddr, port, sender_id, connection):
                     self.hostaddr = hostaddr
                     self.port = str(port)
                     self.sender_id = sender_id
+                    self.connection = connection
 
                 def send(self, d):
                     assert isinstance(d, str), "Can only send string data through simulator."
@@ -156,17 +214,19 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                             SEND_DATA,
                             {
                                 "robot_id": robot_id,
-                                "send_to": self.sender_id,
-                                "connection_string": f"{self.hostaddr}:{self.port}",
+                                "connection": self.connection,
                                 "data": d,
+                                "tick": tick,
                             },
                         )
                     )
-                    wait_for_msg_of_type(SEND_SUCCESS)
+                    msg = wait_for_msg_of_type(SEND_SUCCESS, self.connection)
+                    if "error" in msg:
+                        raise ConnectionError(msg["error"])
 
                 def recv(self, buffer):
                     # At the moment the buffer is ignored.
-                    msg = wait_for_msg_of_type(RECV_DATA)
+                    msg = wait_for_msg_of_type(RECV_DATA, self.connection)
                     return msg["data"]
 
                 def close(self):
@@ -175,11 +235,11 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                             CLOSE_CLIENT,
                             {
                                 "robot_id": robot_id,
-                                "connection_string": f"{self.hostaddr}:{self.port}",
+                                "connection": self.connection,
                             },
                         )
                     )
-                    msg = wait_for_msg_of_type(CLIENT_CLOSED)
+                    msg = wait_for_msg_of_type(CLIENT_CLOSED, self.connection)
 
             class MockedCommClient(MockedCommSocket):
                 def __init__(self, hostaddr, port):
@@ -196,10 +256,10 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                             },
                         )
                     )
-                    msg = wait_for_msg_of_type(SUCCESS_CLIENT_CONNECTION)
+                    msg = wait_for_msg_of_type(SUCCESS_CLIENT_CONNECTION, f"{hostaddr}:{port}")
                     sender_id = msg["host_id"]
                     print(f"Client connected to {sender_id}")
-                    super().__init__(hostaddr, port, sender_id)
+                    super().__init__(hostaddr, port, sender_id, msg["connection"])
 
                 def close(self):
                     super().close()
@@ -221,13 +281,13 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                             },
                         )
                     )
-                    wait_for_msg_of_type(SERVER_SUCCESS)
+                    wait_for_msg_of_type(SERVER_SUCCESS, f"{self.hostaddr}:{self.port}")
                     print(f"Server started on {self.hostaddr}:{self.port}")
                     self.sockets = []
 
                 def accept_client(self):
-                    msg = wait_for_msg_of_type(NEW_CLIENT_CONNECTION)
-                    self.sockets.append(MockedCommSocket(self.hostaddr, self.port, msg["client_id"]))
+                    msg = wait_for_msg_of_type(NEW_CLIENT_CONNECTION, f"{self.hostaddr}:{self.port}")
+                    self.sockets.append(MockedCommSocket(self.hostaddr, self.port, msg["client_id"], msg["connection"]))
                     return self.sockets[-1], (self.hostaddr, self.port)
 
                 def close(self):
@@ -243,7 +303,7 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                             },
                         )
                     )
-                    msg = wait_for_msg_of_type(SERVER_CLOSED)
+                    msg = wait_for_msg_of_type(SERVER_CLOSED, f"{self.hostaddr}:{self.port}")
 
             ### CODE HELPERS
 
@@ -283,6 +343,9 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                     self.k2, self.k3, self.k4 = data_path
                     self.seek_point = 0
 
+                def value(self):
+                    return current_data[self.k2][self.k3][self.k4]
+
                 def read(self):
                     if isinstance(current_data[self.k2][self.k3][self.k4], int):
                         res = str(current_data[self.k2][self.k3][self.k4])
@@ -308,6 +371,18 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                 def flush(self):
                     pass
 
+            def devices_at(class_name, address=None):
+                global device_index
+                if device_index is None:
+                    device_index = {}
+                    for cname, devices in current_data.items():
+                        by_address = {}
+                        for name, attributes in devices.items():
+                            by_address.setdefault(attributes.get("address"), []).append(name)
+                        device_index[cname] = (list(devices), by_address)
+                names, by_address = device_index.get(class_name, ([], {}))
+                return names if address is None else by_address.get(address, [])
+
             def device__init__(self, class_name, name_pattern="*", name_exact=False, **kwargs):
                 self._path = [class_name]
                 self.kwargs = kwargs
@@ -324,7 +399,10 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
                     self._path.append(name_pattern)
                     self._device_index = get_index(name_pattern)
                 else:
-                    for name in current_data[self._path[0]].keys():
+                    # Almost every device is found by its port, so only check the devices on that port.
+                    address = kwargs["address"] if isinstance(kwargs.get("address"), str) else None
+                    names = devices_at(self._path[0], address)
+                    for name in names:
                         for k in kwargs:
                             if k not in current_data[self._path[0]][name]:
                                 break
@@ -348,6 +426,25 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
             def _attribute_file_open(self, name):
                 return MockedFile((self._path[0], self._path[1], name))
 
+            # Sensors are read in tight loops, so skip turning the current value into bytes and parsing it back
+            # when it is already the type asked for. Anything else goes through the file as ev3dev2 would.
+            def get_attr_int(self, attribute, name):
+                if attribute is None:
+                    attribute = self._attribute_file_open(name)
+                value = attribute.value()
+                if type(value) is int:
+                    return attribute, value
+                attribute, value = self._get_attribute(attribute, name)
+                return attribute, int(value)
+
+            def get_attr_string(self, attribute, name):
+                if attribute is None:
+                    attribute = self._attribute_file_open(name)
+                value = attribute.value()
+                if type(value) is str:
+                    return attribute, value.strip()
+                return self._get_attribute(attribute, name)
+
             def wait(self, cond, timeout=None):
                 tic = get_time()
                 if cond(self.state):
@@ -451,57 +548,65 @@ def attach_bot(robot_id, filename, fake_roots, result_queue, result_queue_intern
 
                     self.previous_presses = new_state
 
-            orig_import = __import__
-
-            def import_mock(name, *args):
-                if name in ("fcntl", "evdev"):
-                    return mock.Mock()
-                return orig_import(name, *args)
+            # ev3dev2 talks to the brick's hardware through these. They are put straight into sys.modules rather
+            # than wrapping __import__, so every other import the bot makes runs at full speed.
+            stubbed_modules = {"fcntl": mock.Mock(), "evdev": mock.Mock()}
 
             def raiseEV3Error():
                 raise ValueError(
                     "This simulator is not compatible with ev3dev. Please use ev3dev2: https://pypi.org/project/python-ev3dev2/"
                 )
 
-            @safe_patch("time", "time", get_time)
-            @safe_patch("time", "sleep", sleep)
-            @safe_patch("ev3dev2.motor", "Motor.wait", wait)
-            @safe_patch("ev3dev2", "Device.__init__", device__init__)
-            @safe_patch("ev3dev2", "Device._attribute_file_open", _attribute_file_open)
-            @safe_patch("ev3dev2.button", "Button", MockedButton)
-            @safe_patch("ev3sim.code_helpers", "is_ev3", False)
-            @safe_patch("ev3sim.code_helpers", "is_sim", True)
-            @safe_patch("ev3sim.code_helpers", "robot_id", robot_id)
-            @safe_patch("ev3sim.code_helpers", "wait_for_tick", wait_for_tick)
-            @safe_patch("ev3sim.code_helpers", "CommServer", MockedCommServer)
-            @safe_patch("ev3sim.code_helpers", "CommClient", MockedCommClient)
-            @safe_patch("ev3sim.code_helpers", "wait_for_tick", wait_for_tick)
-            @safe_patch("builtins", "__import__", import_mock)
-            @safe_patch("ev3sim.code_helpers", "CommandSystem", MockCommandSystem)
-            @safe_patch("ev3sim.code_helpers", "EventSystem.handle_events", handle_events)
-            @safe_patch("sys", "path", fake_path)
-            @safe_patch("builtins", "input", fake_input)
-            # These ev3dev2 objects are not implemented in the sim.
-            @safe_patch("ev3dev2", "led", mock.Mock())
-            @safe_patch("ev3dev2.led", "Leds", mock.Mock())
-            @safe_patch("ev3dev2", "sound", mock.Mock())
-            @safe_patch("ev3dev2.sound", "Sound", mock.Mock())
-            @safe_patch("ev3dev2", "display", mock.Mock())
-            @safe_patch("ev3dev2.display", "Display", mock.Mock())
-            @safe_patch("ev3dev2", "console", mock.Mock())
-            @safe_patch("ev3dev2.console", "Console", mock.Mock())
-            # TODO: This should probably actually give reasonable values for voltage/current/amps
-            @safe_patch("ev3dev2", "power", mock.Mock())
-            @safe_patch("ev3dev2.power", "Power", mock.Mock())
-            @safe_patch("ev3dev2", "fonts", mock.Mock())
-            @safe_patch("ev3dev.core", "Device.__init__", raiseEV3Error)
+            patches = [
+                ("builtins", "print", print_mock),
+                ("ev3sim.code_helpers", "format_print", format_print_mock),
+                ("time", "time", get_time),
+                ("time", "sleep", sleep),
+                ("ev3dev2.motor", "Motor.wait", wait),
+                ("ev3dev2", "Device.__init__", device__init__),
+                ("ev3dev2", "Device._attribute_file_open", _attribute_file_open),
+                ("ev3dev2", "Device.get_attr_int", get_attr_int),
+                ("ev3dev2", "Device.get_attr_string", get_attr_string),
+                ("ev3dev2.button", "Button", MockedButton),
+                ("ev3sim.code_helpers", "is_ev3", False),
+                ("ev3sim.code_helpers", "is_sim", True),
+                ("ev3sim.code_helpers", "robot_id", robot_id),
+                ("ev3sim.code_helpers", "wait_for_tick", wait_for_tick),
+                ("ev3sim.code_helpers", "CommServer", MockedCommServer),
+                ("ev3sim.code_helpers", "CommClient", MockedCommClient),
+                ("ev3sim.code_helpers", "CommandSystem", MockCommandSystem),
+                ("ev3sim.code_helpers", "EventSystem.handle_events", handle_events),
+                ("sys", "path", fake_path),
+                ("builtins", "input", fake_input),
+                # These ev3dev2 objects are not implemented in the sim.
+                ("ev3dev2", "led", mock.Mock()),
+                ("ev3dev2.led", "Leds", mock.Mock()),
+                ("ev3dev2", "sound", mock.Mock()),
+                ("ev3dev2.sound", "Sound", mock.Mock()),
+                ("ev3dev2", "display", mock.Mock()),
+                ("ev3dev2.display", "Display", mock.Mock()),
+                ("ev3dev2", "console", mock.Mock()),
+                ("ev3dev2.console", "Console", mock.Mock()),
+                # TODO: This should probably actually give reasonable values for voltage/current/amps
+                ("ev3dev2", "power", mock.Mock()),
+                ("ev3dev2.power", "Power", mock.Mock()),
+                ("ev3dev2", "fonts", mock.Mock()),
+                ("ev3dev.core", "Device.__init__", raiseEV3Error),
+            ]
+
             def run_script(fname):
-                from importlib.machinery import SourceFileLoader
+                import importlib.util
+                from ev3sim.simulation.code_cache import load_code
 
+                code = load_code(fname, cache_dir)
+                module = importlib.util.module_from_spec(importlib.util.spec_from_file_location("__main__", fname))
+                if OWNS_PROCESS:
+                    sys.modules["__main__"] = module
                 wait_for_tick()
-                module = SourceFileLoader("__main__", fname).load_module()
+                exec(code, module.__dict__)
 
-            run_script(fname)
+            with apply_patches(patches, stubbed_modules):
+                run_script(fname)
 
         run_code(filename, fake_roots, rq, sq)
     except Exception as e:
@@ -1,5 +1,8 @@
+import copy
+from ev3sim.simulation.input_replay import InputPlayer
 from ev3sim.simulation.loader import ScriptLoader, StateHandler, initialiseFromConfig
 from ev3sim.simulation.randomisation import Randomiser
+from ev3sim.simulation.world import World
 import yaml
 from ev3sim.file_helper import find_abs
 from ev3sim.utils import Queue, recursive_merge
@@ -34,18 +37,46 @@ def simulate(batch_file, preset_filename, bot_paths, seed, override_settings, *q
 
 def batched_run(batch_file, seed):
 
-    with open(batch_file, "r") as f:
-        config = yaml.safe_load(f)
+    player = None
+    if batch_file.endswith(".ev3in"):
+        # Re-simulate a recorded match, with the same batch and seed.
+        player = InputPlayer(batch_file)
+        config = player.header["batch"]
+        seed = player.header["seed"]
+        print(f"Playing back recorded bot messages with seed {seed}")
+    elif batch_file.endswith(".ev3rec"):
+        # Replays are played back by an interactor, with no bots.
+        config = {"preset_file": "replay.yaml", "bots": [], "settings": {"replay": {"FILENAME": batch_file}}}
+    else:
+        with open(batch_file, "r") as f:
+            config = yaml.safe_load(f)
 
     bot_paths = [x for x in config["bots"]]
     sim_args = [batch_file, config["preset_file"], bot_paths, seed, config.get("settings", {})]
-    queues = [Queue() for _ in range(2 * len(bot_paths) + 1)]
+    ScriptLoader.instance.bot_context = ScriptLoader.botContext()
+    queues = [Queue(ctx=ScriptLoader.instance.bot_context) for _ in range(2 * len(bot_paths) + 1)]
     queue_with_count = [(q, q._internal_size) for q in queues]
 
     sim_args.extend(queue_with_count)
 
     ScriptLoader.instance.reset()
     ScriptLoader.instance.startUp()
+    if player is not None:
+        ScriptLoader.instance.playInputs(player)
 
     # Begin the sim process.
     simulate(*sim_args)
+
+    if ScriptLoader.RECORD_INPUTS and bot_paths and player is None:
+        batch = copy.deepcopy(config)
+        # Keep the settings that decide how the physics plays out, in case they are changed before playing back.
+        recursive_merge(
+            batch.setdefault("settings", {}),
+            {
+                "app": {
+                    "tick_rate": ScriptLoader.GAME_TICK_RATE,
+                    "physics_profile": World.PHYSICS_PROFILE,
+                }
+            },
+        )
+        ScriptLoader.instance.startInputRecording(batch, seed)
@@ -8,6 +8,7 @@ SEND_DATA = 5
 MESSAGE_PRINT = 6
 BOT_COMMAND = 7
 MESSAGE_INPUT_REQUESTED = 8
+TICK_FINISHED = 9
 
 # Simulation writes
 SIM_DATA = 0
@@ -19,6 +20,7 @@ RECV_DATA = 5
 SEND_SUCCESS = 6
 SERVER_SUCCESS = 7
 SIM_INPUT = 8
+TURN_OVER = 9
 
 # Command information
 EV3SIM_BOT_COMMAND = "EV3SIM_BOT_COMMAND"
@@ -346,6 +346,8 @@ def main(passed_args=None):
             pushed_screens, pushed_kwargss = run_bot(folder, edit=args.edit)
         elif args.elem.endswith(".sim"):
             pushed_screens, pushed_kwargss = run_sim(args.elem, edit=args.edit)
+        elif args.elem.endswith((".ev3rec", ".ev3in")):
+            pushed_screens, pushed_kwargss = [ScreenObjectManager.SCREEN_SIM], [{"batch": args.elem}]
         else:
             # Some sort of folder. Either a bot folder, or custom task folder.
             config_path = join(args.elem, "config.bot")
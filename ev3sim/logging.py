@@ -31,8 +31,10 @@ class Logger:
 
     def writeMessage(self, robot_id, msg, **kwargs):
         if Logger.LOG_CONSOLE:
-            ScreenObjectManager.instance.screens[ScreenObjectManager.SCREEN_SIM].printStyledMessage(
-                f"[{robot_id}] {msg}", **kwargs
+            ScreenObjectManager.instance.runOnMainThread(
+                ScreenObjectManager.instance.screens[ScreenObjectManager.SCREEN_SIM].printStyledMessage,
+                f"[{robot_id}] {msg}",
+                **kwargs,
             )
         # Remove formatting.
         msg = msg.replace("<b>", "").replace("</b>", "").replace("<i>", "").replace("</i>", "").replace("</font>", "")
@@ -45,7 +47,9 @@ class Logger:
     def reportError(self, robot_id, traceback):
         if Logger.LOG_CONSOLE:
             robot_index = int(robot_id.split("-")[1])
-            ScreenObjectManager.instance.screens[ScreenObjectManager.SCREEN_SIM].printError(robot_index)
+            ScreenObjectManager.instance.runOnMainThread(
+                ScreenObjectManager.instance.screens[ScreenObjectManager.SCREEN_SIM].printError, robot_index
+            )
         with open(self.getFilename(robot_id), "a") as f:
             f.write(traceback)
 
@@ -93,6 +93,10 @@ class PhysicsObject(BaseObject):
 
     static: bool
 
+    # friction_coefficient is the proportion of velocity retained after a single tick at this tick rate.
+    # Damping is scaled by the actual timestep so that changing the tick rate doesn't change the decay per second.
+    FRICTION_TICK_RATE = 30
+
     def initFromKwargs(self, **kwargs):
         super().initFromKwargs(**kwargs)
         self.mass = kwargs.get("mass", 1)
@@ -107,6 +111,8 @@ class PhysicsObject(BaseObject):
         self.shape.obj = self
         self.shape.actual_obj = self
         self.body.position = [a + b for a, b in zip(self.position, self.visual.getPositionAnchorOffset())]
+        if not self.static:
+            self.body.velocity_func = self.update_velocity
         for child in self.children:
             if isinstance(child, PhysicsObject):
                 child.body, child.shape = child.visual.generateBodyAndShape(
@@ -120,13 +126,13 @@ class PhysicsObject(BaseObject):
         if not self.static:
             self.position = np.array(self.body.position) - self.visual.getPositionAnchorOffset()
             self.rotation = self.body.angle
-            self.update_velocities()
 
-    @stop_on_pause
-    def update_velocities(self):
-        # No angular friction or air resistance/velocity dampening, so do this.
-        self.body.angular_velocity *= self.friction_coefficient
-        self.body.velocity = [v * self.friction_coefficient for v in self.body.velocity]
+    def update_velocity(self, body, gravity, damping, dt):
+        # No angular friction or air resistance/velocity dampening, so integrate forces and then damp by friction.
+        pymunk.Body.update_velocity(body, gravity, 1, dt)
+        retained = self.friction_coefficient ** (dt * self.FRICTION_TICK_RATE)
+        body.angular_velocity *= retained
+        body.velocity *= retained
 
     @stop_on_pause
     def apply_force(self, f, pos=None):
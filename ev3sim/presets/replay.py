@@ -0,0 +1,71 @@
+import ev3sim.visual.utils
+from ev3sim.settings import ObjectSetting, SettingsManager
+from ev3sim.simulation.interactor import IInteractor
+from ev3sim.simulation.loader import ScriptLoader
+from ev3sim.simulation.replay import (
+    RECORD_EVENT,
+    RECORD_FILL,
+    RECORD_KEY,
+    RECORD_POSE,
+    RECORD_REMOVE,
+    RECORD_STRING,
+    ReplayReader,
+)
+from ev3sim.simulation.world import stop_on_pause
+from ev3sim.visual.manager import ScreenObjectManager
+from ev3sim.visual.objects import visualFactory
+
+
+class ReplayInteractor(IInteractor):
+    """Plays back a replay file, one recorded tick per tick, without any physics or bots."""
+
+    FILENAME = None
+
+    def startUp(self):
+        self.reader = ReplayReader(self.FILENAME)
+        header = self.reader.header
+        ev3sim.visual.utils.GLOBAL_COLOURS = header["colours"]
+        SettingsManager.instance.setMany({"app": {"tick_rate": header["tick_rate"]}, "screen": header["screen"]})
+        self.ticks = self.reader.ticks()
+        self.keys = {}
+        self.finished = False
+
+    @stop_on_pause
+    def tick(self, tick):
+        if self.finished:
+            return False
+        try:
+            _, records = next(self.ticks)
+        except StopIteration:
+            self.finished = True
+            ScriptLoader.instance.printSystemMessage("The replay has finished.")
+            return False
+        events = {}
+        for record in records:
+            if record[0] == RECORD_EVENT:
+                events.setdefault(record[2], []).append(record[1])
+                continue
+            if record[0] == RECORD_KEY:
+                _, index, key, options = record
+                self.keys[index] = key
+                ScreenObjectManager.instance.registerVisual(visualFactory(**options), key, overwrite_key=True)
+                continue
+            key = self.keys[record[1]]
+            if record[0] == RECORD_REMOVE:
+                del self.keys[record[1]]
+                ScreenObjectManager.instance.unregisterVisual(key)
+                continue
+            visual = ScreenObjectManager.instance.objects[key]
+            if record[0] == RECORD_POSE:
+                visual.position = record[2:4]
+                visual.rotation = record[4]
+            elif record[0] == RECORD_FILL:
+                visual.fill = record[2]
+            elif record[0] == RECORD_STRING:
+                setattr(visual, record[2], record[3])
+        for event_name, robot_ids in events.items():
+            ScriptLoader.instance.printSystemMessage(f"{event_name}: {', '.join(robot_ids)}")
+        return False
+
+
+replay_settings = {"FILENAME": ObjectSetting(ReplayInteractor, "FILENAME")}
@@ -1,4 +1,5 @@
 from ev3sim.presets.tiles.checkers.RescueChecker import BaseRescueChecker
+from ev3sim.simulation.loader import ScriptLoader
 
 
 class CompletedChecker(BaseRescueChecker):
@@ -105,3 +106,4 @@ class CompletedChecker(BaseRescueChecker):
                 self.incrementScore(self.COMPLETE_SCORE)
                 self.completed = True
                 print(f"Completed tile {self.index}")
+                ScriptLoader.instance.checkFastForward("onTileCompleted", self.index)
@@ -82,6 +82,7 @@ def initialise_bot(topLevelConfig, robotFolder, prefix, path_index):
             if scriptname is not None:
                 scriptname = find_abs(scriptname, code_locations(robotFolder))
             ScriptLoader.instance.scriptnames[prefix] = scriptname
+            ScriptLoader.instance.trusted[prefix] = config.get("trusted", False)
 
         except yaml.YAMLError as exc:
             print(f"An error occurred while loading robot preset {robotFolder}. Exited with error: {exc}")
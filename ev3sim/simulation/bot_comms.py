@@ -1,10 +1,89 @@
+import math
+from collections import deque
+
 from ev3sim.constants import *
 
 
+class Link:
+    """One direction of a connection, holding messages that are yet to be delivered."""
+
+    def __init__(self, recipient):
+        self.recipient = recipient
+        # (tick it can arrive, data, tick it was sent) for each message accepted onto the link.
+        self.in_flight = deque()
+        # (data, tick it was sent) for messages waiting for space on the link.
+        self.waiting = deque()
+        self.credit = 0
+        self.bytes = 0
+        self.max_backlog = 0
+
+    @property
+    def backlog(self):
+        return len(self.in_flight) + len(self.waiting)
+
+
+class Connection:
+    """An open connection between a server's host and one client, with delivery stats."""
+
+    def __init__(self, index, connection_string, host_id, client_id):
+        self.index = index
+        self.connection_string = connection_string
+        self.host_id = host_id
+        self.client_id = client_id
+        self.links = {host_id: Link(client_id), client_id: Link(host_id)}
+        self.messages = 0
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def otherEnd(self, robot_id):
+        if robot_id == self.host_id:
+            return self.client_id
+        if robot_id == self.client_id:
+            return self.host_id
+        return None
+
+    def recordDelivery(self, latency):
+        self.messages += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    @property
+    def meanLatency(self):
+        return self.total_latency / self.messages if self.messages else 0
+
+    @property
+    def bytes(self):
+        return sum(link.bytes for link in self.links.values())
+
+    @property
+    def backlog(self):
+        return sum(link.backlog for link in self.links.values())
+
+
 class BotCommService:
+    """
+    Passes messages between bots. Each connection between a server and a client gets an index, which both ends use
+    to send and close it, and which tags everything delivered on it so bots can keep a mailbox per connection.
+
+    With any of the LINK settings, each direction of a connection behaves like a Bluetooth link: messages take
+    ``LINK_LATENCY_TICKS`` to arrive, at most ``LINK_BYTES_PER_TICK`` are delivered each tick, and a send isn't
+    acknowledged until there is space for it among the ``LINK_QUEUE_LIMIT`` messages the link holds.
+    """
+
+    # 0 turns each of these off.
+    LINK_LATENCY_TICKS = 0
+    LINK_BYTES_PER_TICK = 0
+    LINK_QUEUE_LIMIT = 0
+
     def __init__(self):
         self.servers = {}
         self.waiting_clients = []
+        self.connections = []
+
+    def sendTo(self, robot_id, message_type, data):
+        from ev3sim.simulation.loader import ScriptLoader
+
+        ScriptLoader.instance.queues[robot_id][ScriptLoader.SEND].put((message_type, data))
 
     def serverAvailable(self, connection_string):
         return connection_string in self.servers
@@ -16,69 +95,101 @@ class BotCommService:
             self.waiting_clients.append((client_id, connection_string))
 
     def connectToServer(self, client_id, connection_string):
-        self.servers[connection_string]["connections"].append(client_id)
-        from ev3sim.simulation.loader import ScriptLoader
-
-        ScriptLoader.instance.queues[client_id][ScriptLoader.SEND].put(
-            (
-                SUCCESS_CLIENT_CONNECTION,
-                {
-                    "host_id": self.servers[connection_string]["host_id"],
-                },
-            )
+        host_id = self.servers[connection_string]
+        connection = Connection(len(self.connections), connection_string, host_id, client_id)
+        self.connections.append(connection)
+        self.sendTo(
+            client_id,
+            SUCCESS_CLIENT_CONNECTION,
+            {"host_id": host_id, "connection_string": connection_string, "connection": connection.index},
         )
-        ScriptLoader.instance.queues[self.servers[connection_string]["host_id"]][ScriptLoader.SEND].put(
-            (
-                NEW_CLIENT_CONNECTION,
-                {
-                    "client_id": client_id,
-                },
-            )
+        self.sendTo(
+            host_id,
+            NEW_CLIENT_CONNECTION,
+            {"client_id": client_id, "connection_string": connection_string, "connection": connection.index},
         )
 
     def startServer(self, connection_string, robot_id):
-        self.servers[connection_string] = {
-            "host_id": robot_id,
-            "connections": [],
-        }
-        to_remove = []
-        for i, (client_id, c_string) in enumerate(self.waiting_clients):
+        self.servers[connection_string] = robot_id
+        self.sendTo(robot_id, SERVER_SUCCESS, {"connection_string": connection_string})
+        still_waiting = []
+        for client_id, c_string in self.waiting_clients:
             if c_string == connection_string:
                 self.connectToServer(client_id, c_string)
-                to_remove.append(i)
-        for idx in to_remove[::-1]:
-            del self.waiting_clients[idx]
-        from ev3sim.simulation.loader import ScriptLoader
-
-        ScriptLoader.instance.queues[robot_id][ScriptLoader.SEND].put((SERVER_SUCCESS, {}))
+            else:
+                still_waiting.append((client_id, c_string))
+        self.waiting_clients = still_waiting
 
     def closeServer(self, connection_string, robot_id):
-        assert self.serverAvailable(connection_string), "Server already closed."
-        assert self.servers[connection_string]["host_id"] == robot_id, "You are not the host of this server."
-        del self.servers[connection_string]
-
-    def closeClient(self, connection_string, robot_id):
-        assert self.serverAvailable(connection_string), "Server already closed."
-        assert robot_id in self.servers[connection_string]["connections"], "You are not the connected to this server."
-        self.servers[connection_string]["connections"].remove(robot_id)
-
-    def handleSend(self, origin_id, post_id, connection_string, data):
-        assert self.serverAvailable(connection_string), "Server not closed, or otherwise unavailable."
-        assert (
-            origin_id == self.servers[connection_string]["host_id"]
-            and post_id in self.servers[connection_string]["connections"]
-        ) or (
-            post_id == self.servers[connection_string]["host_id"]
-            and origin_id in self.servers[connection_string]["connections"]
-        ), "Communications between robots should be between a server and client."
+        if self.servers.get(connection_string) == robot_id:
+            del self.servers[connection_string]
+        self.sendTo(robot_id, SERVER_CLOSED, {"connection_string": connection_string})
+
+    def openConnection(self, index, robot_id):
+        """Returns connection `index` if it is open and `robot_id` is one of its ends."""
+        if 0 <= index < len(self.connections):
+            connection = self.connections[index]
+            if connection is not None and connection.otherEnd(robot_id) is not None:
+                return connection
+        return None
+
+    def closeClient(self, index, robot_id):
+        if self.openConnection(index, robot_id) is not None:
+            self.connections[index] = None
+        self.sendTo(robot_id, CLIENT_CLOSED, {"connection": index})
+
+    def linksModelled(self):
+        return self.LINK_LATENCY_TICKS > 0 or self.LINK_BYTES_PER_TICK > 0 or self.LINK_QUEUE_LIMIT > 0
+
+    def handleSend(self, origin_id, index, data, sent_tick, current_tick):
+        connection = self.openConnection(index, origin_id)
+        if connection is None:
+            self.sendTo(origin_id, SEND_SUCCESS, {"connection": index, "error": "This connection has been closed."})
+            return
+        if not self.linksModelled():
+            self.sendTo(connection.otherEnd(origin_id), RECV_DATA, {"connection": index, "data": data})
+            self.sendTo(origin_id, SEND_SUCCESS, {"connection": index})
+            connection.links[origin_id].bytes += len(data.encode("utf-8"))
+            connection.recordDelivery(current_tick - sent_tick)
+            return
+        link = connection.links[origin_id]
+        link.waiting.append((data, sent_tick))
+        self.acceptWaiting(connection, origin_id, current_tick)
+        link.max_backlog = max(link.max_backlog, link.backlog)
+
+    def acceptWaiting(self, connection, origin_id, current_tick):
+        link = connection.links[origin_id]
+        while link.waiting and (self.LINK_QUEUE_LIMIT <= 0 or len(link.in_flight) < self.LINK_QUEUE_LIMIT):
+            data, sent_tick = link.waiting.popleft()
+            link.in_flight.append((current_tick + self.LINK_LATENCY_TICKS, data, sent_tick))
+            self.sendTo(origin_id, SEND_SUCCESS, {"connection": connection.index})
+
+    def tick(self, current_tick):
+        """Delivers everything that has made it across its link by `current_tick`, in one batch per link."""
+        if not self.linksModelled():
+            return
         from ev3sim.simulation.loader import ScriptLoader
 
-        ScriptLoader.instance.queues[post_id][ScriptLoader.SEND].put(
-            (
-                RECV_DATA,
-                {
-                    "data": data,
-                },
-            )
-        )
-        ScriptLoader.instance.queues[origin_id][ScriptLoader.SEND].put((SEND_SUCCESS, {}))
+        budget = self.LINK_BYTES_PER_TICK if self.LINK_BYTES_PER_TICK > 0 else math.inf
+        for connection in self.connections:
+            if connection is None:
+                continue
+            for origin_id, link in connection.links.items():
+                link.credit += budget
+                delivered = []
+                while link.in_flight and link.in_flight[0][0] <= current_tick:
+                    _, data, sent_tick = link.in_flight[0]
+                    size = len(data.encode("utf-8"))
+                    if size > link.credit:
+                        break
+                    link.in_flight.popleft()
+                    link.credit -= size
+                    link.bytes += size
+                    connection.recordDelivery(current_tick - sent_tick)
+                    delivered.append((RECV_DATA, {"connection": connection.index, "data": data}))
+                if not link.in_flight or link.in_flight[0][0] > current_tick:
+                    # Bandwidth only carries over for a message that is too big to arrive in a single tick.
+                    link.credit = 0
+                if delivered:
+                    ScriptLoader.instance.queues[link.recipient][ScriptLoader.SEND].put_many(delivered)
+                self.acceptWaiting(connection, origin_id, current_tick)
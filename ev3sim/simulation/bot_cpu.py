@@ -0,0 +1,46 @@
+class BotCpuUsage:
+    """
+    Tracks the CPU time used by a bot's process, as reported by the process itself once per tick it handles.
+
+    With a budget, a bot that has used more CPU than the ticks it has been given allow has its next ticks held back,
+    so a fast machine doesn't let it run more code per simulated second than a slower one would.
+    """
+
+    def __init__(self):
+        self.last_reported = None
+        self.total = 0
+        self.ticks = 0
+        self.delayed_ticks = 0
+        # CPU time used beyond the budget so far. Negative when some budget is left over.
+        self.debt = 0
+
+    def report(self, cpu_time):
+        """Update with the total CPU time the process has used."""
+        if self.last_reported is None:
+            # Starting the process and importing the bot's code happens before the first tick, so isn't counted.
+            self.last_reported = cpu_time
+            return
+        used = cpu_time - self.last_reported
+        self.last_reported = cpu_time
+        self.total += used
+        self.debt += used
+
+    def allowTick(self, budget):
+        """
+        Called every tick, returns whether this tick should be sent to the bot.
+
+        :param float budget: CPU seconds the bot may use each tick, or 0 for no limit.
+        """
+        self.ticks += 1
+        if budget <= 0:
+            return True
+        allowed = self.debt <= 0
+        # Leftover budget only carries into the next tick, so idling can't save up for a burst.
+        self.debt = max(self.debt - budget, -budget)
+        if not allowed:
+            self.delayed_ticks += 1
+        return allowed
+
+    @property
+    def perTick(self):
+        return self.total / self.ticks if self.ticks else 0
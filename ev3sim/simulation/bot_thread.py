@@ -0,0 +1,254 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+from queue import Empty
+
+
+class BotStopped(BaseException):
+    """Raised in a bot's thread to end it, the next time it waits for a tick."""
+
+
+class ThreadQueue:
+    """The parts of :class:`ev3sim.utils.Queue` bots and the simulator use, for a bot on a thread, with no pickling."""
+
+    def __init__(self):
+        self.items = deque()
+        self._internal_size = None
+        self.put_count = 0
+        self.get_count = 0
+
+    def put(self, item):
+        self.items.append(item)
+        self.put_count += 1
+
+    def put_many(self, items):
+        self.items.extend(items)
+        self.put_count += len(items)
+
+    def get_nowait(self):
+        try:
+            item = self.items.popleft()
+        except IndexError:
+            raise Empty
+        self.get_count += 1
+        return item
+
+    def get_all(self):
+        items = []
+        while self.items:
+            items.append(self.items.popleft())
+        self.get_count += len(items)
+        return items
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+
+class BotPatches:
+    """
+    Applies the patches from :func:`ev3sim.attach_bot.attach_bot` for bots that share the simulator's process.
+
+    Each patched attribute is replaced once, by something that looks up the version belonging to the bot running on the
+    current thread, and falls back to the original everywhere else. Functions are replaced by a function, so they also
+    work when looked up as globals of their own module or as builtins. Other values are replaced by a property on the
+    module, which covers attribute access and ``from module import name``.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.bound = 0
+        self.restore = []
+        self.installed = set()
+
+    def current(self, key, original):
+        patches = getattr(self.local, "patches", None)
+        if patches is not None and key in patches:
+            return patches[key]
+        return original
+
+    def install(self, mname, cname, obj):
+        """
+        Makes `mname`.`cname` look up the bot on the current thread, returning False if there is nothing to patch,
+        as :func:`ev3sim.attach_bot.safe_patch` skips it.
+        """
+        key = (mname, cname)
+        if key in self.installed:
+            return True
+        try:
+            module = importlib.import_module(mname)
+            owner_name, _, attribute = cname.rpartition(".")
+            owner = getattr(module, owner_name) if owner_name else module
+            original = owner.__dict__[attribute] if isinstance(owner, type) else getattr(owner, attribute)
+        except Exception:
+            return False
+        # Class and static methods dispatch on the function they wrap, and are wrapped again on the class.
+        wrapper = type(obj) if isinstance(obj, (classmethod, staticmethod)) else None
+        if isinstance(obj.__func__ if wrapper else obj, types.FunctionType):
+            if wrapper is not None:
+                fallback = getattr(original, "__func__", original)
+            elif isinstance(original, (classmethod, staticmethod)):
+                fallback = original.__get__(None, owner)
+            else:
+                fallback = original
+
+            def dispatch(*args, **kwargs):
+                return self.current(key, fallback)(*args, **kwargs)
+
+            setattr(owner, attribute, wrapper(dispatch) if wrapper else dispatch)
+            self.restore.append(lambda: setattr(owner, attribute, original))
+        elif not owner_name:
+            if type(module) is types.ModuleType:
+                module.__class__ = type(f"BotPatched_{mname}", (types.ModuleType,), {})
+                self.restore.append(lambda: setattr(module, "__class__", types.ModuleType))
+
+            def get(module):
+                return self.current(key, module.__dict__[attribute])
+
+            def set(module, value):
+                module.__dict__[attribute] = value
+
+            setattr(type(module), attribute, property(get, set))
+            self.restore.append(lambda: delattr(type(module), attribute))
+        else:
+            raise TypeError(f"Can't patch {mname}.{cname} for bots on threads.")
+        self.installed.add(key)
+        return True
+
+    def uninstall(self):
+        for restore in reversed(self.restore):
+            restore()
+        self.restore = []
+        self.installed = set()
+
+    @staticmethod
+    def unstub(name, module):
+        if sys.modules.get(name) is module:
+            del sys.modules[name]
+
+    @contextmanager
+    def apply(self, patches, stubbed_modules):
+        """Used by bots on threads in place of :func:`ev3sim.attach_bot.apply_patches`."""
+        bound = {}
+        added_paths = []
+        with self.lock:
+            for name, module in stubbed_modules.items():
+                # Anything the simulator has already imported is left alone.
+                if name not in sys.modules:
+                    sys.modules[name] = module
+                    self.restore.append(lambda name=name, module=module: self.unstub(name, module))
+            try:
+                for mname, cname, obj in patches:
+                    if (mname, cname) == ("sys", "path"):
+                        # Imports look at sys.path directly, so bots can only add their own folders to it.
+                        added_paths = [path for path in obj if path not in sys.path]
+                        sys.path[:0] = added_paths
+                    elif self.install(mname, cname, obj):
+                        bound[(mname, cname)] = obj.__func__ if isinstance(obj, (classmethod, staticmethod)) else obj
+            except Exception:
+                for path in added_paths:
+                    sys.path.remove(path)
+                if self.bound == 0:
+                    self.uninstall()
+                raise
+            self.bound += 1
+        self.local.patches = bound
+        try:
+            yield
+        finally:
+            self.local.patches = None
+            with self.lock:
+                for path in added_paths:
+                    if path in sys.path:
+                        sys.path.remove(path)
+                self.bound -= 1
+                if self.bound == 0:
+                    self.uninstall()
+
+
+patches = BotPatches()
+
+
+class BotThread:
+    """
+    Runs a trusted bot's script on a thread in the simulator's process, taking turns with the simulator.
+
+    The bot gets its own copy of :mod:`ev3sim.attach_bot`, so the state kept in that module's globals is its own, and
+    waiting for the next tick hands control straight back to the simulator instead of waiting on a process queue.
+    It has the same methods as a :class:`multiprocessing.Process` that the loader uses.
+    """
+
+    pid = None
+    # How long to wait for a bot to reach its next wait for a tick once it has been told to stop.
+    STOP_TIMEOUT = 2
+
+    def __init__(self, robot_id, args):
+        self.robot_id = robot_id
+        self.args = args
+        self.condition = threading.Condition()
+        self.bot_turn = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name=f"Bot {robot_id}", daemon=True)
+
+    def run(self):
+        spec = importlib.util.find_spec("ev3sim.attach_bot")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.OWNS_PROCESS = False
+        module.apply_patches = patches.apply
+        module.process_time = time.thread_time
+        # Both ways a bot waits for the simulator hand it the rest of the bot's turn.
+        module.wait_for_queues = lambda queues, timeout: self.yieldTurn()
+        module.sleep = lambda seconds: self.yieldTurn()
+        try:
+            module.attach_bot(self.robot_id, *self.args)
+        except BotStopped:
+            pass
+        finally:
+            with self.condition:
+                self.bot_turn = False
+                self.condition.notify_all()
+
+    def yieldTurn(self):
+        with self.condition:
+            self.bot_turn = False
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: self.bot_turn or self.stopping)
+            if self.stopping:
+                raise BotStopped()
+
+    def start(self):
+        # The bot's first turn starts once it is ready to run its script.
+        with self.condition:
+            self.bot_turn = True
+            self.thread.start()
+            self.condition.wait_for(lambda: not self.bot_turn)
+
+    def runTurn(self, timeout):
+        """Lets the bot run until it waits for the next tick, returning False if that took longer than `timeout`."""
+        with self.condition:
+            self.bot_turn = True
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: not self.bot_turn, timeout)
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def terminate(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+    def join(self, timeout=None):
+        self.thread.join(self.STOP_TIMEOUT if timeout is None else timeout)
+
+    def close(self):
+        pass
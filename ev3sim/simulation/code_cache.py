@@ -0,0 +1,85 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+
+
+def cache_directory(name):
+    """The workspace folder to keep one kind of compiled bot code in, or None if there is no workspace to use."""
+    from ev3sim.file_helper import find_abs_directory
+
+    try:
+        return find_abs_directory(f"workspace/.cache/{name}/", create=True)
+    except (ValueError, OSError):
+        return None
+
+
+def write_atomically(path, *parts):
+    # Write somewhere else first, so a bot starting from the same file never reads half of it.
+    partial_path = f"{path}.{os.getpid()}"
+    with open(partial_path, "wb") as f:
+        for part in parts:
+            f.write(part)
+    os.replace(partial_path, path)
+
+
+def load_code(fname, cache_dir=None):
+    """
+    Compile the script at `fname`, reusing the last compilation if the source hasn't changed since.
+
+    Each script has a single cache file, named after its path, which holds the hash of the source it was compiled from.
+    """
+    with open(fname, "rb") as f:
+        source = f.read()
+    if cache_dir is None:
+        return compile(source, fname, "exec", dont_inherit=True)
+    source_hash = hashlib.sha256(importlib.util.MAGIC_NUMBER + source).digest()
+    cache_file = os.path.join(cache_dir, hashlib.sha256(fname.encode("utf-8")).hexdigest() + ".pyc")
+    try:
+        with open(cache_file, "rb") as f:
+            if f.read(len(source_hash)) == source_hash:
+                return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    code = compile(source, fname, "exec", dont_inherit=True)
+    try:
+        write_atomically(cache_file, source_hash, marshal.dumps(code))
+    except OSError:
+        pass
+    return code
+
+
+def mindstorms_path(project, cache_dir):
+    """Where the python compiled from the Mindstorms `project` is kept."""
+    if cache_dir is None:
+        return os.path.join(os.path.dirname(project), ".compiled.py")
+    try:
+        from importlib.metadata import version
+
+        compiler = version("mindpile").encode("utf-8")
+    except Exception:
+        compiler = b""
+    with open(project, "rb") as f:
+        project_hash = hashlib.sha256(compiler + f.read()).hexdigest()
+    return os.path.join(cache_dir, f"{project_hash}.py")
+
+
+def compile_mindstorms(project, cache_dir=None):
+    """
+    Returns the path to a python script compiled from the Mindstorms `project`, only compiling it if there isn't one for
+    this version of the project in `cache_dir` already. Without a cache, the script is compiled next to the project.
+    """
+    compiled = mindstorms_path(project, cache_dir)
+    if cache_dir is not None and os.path.exists(compiled):
+        return compiled
+    try:
+        from mindpile import from_ev3
+
+        source = from_ev3(project, ev3sim_support=True)
+    except Exception as e:
+        source = f"print({f'Mindstorms compilation failed! {e}'!r})"
+        if cache_dir is not None:
+            # Keep failures separate so the project is compiled again next time.
+            compiled = compiled[:-3] + ".failed.py"
+    write_atomically(compiled, source.encode("utf-8"))
+    return compiled
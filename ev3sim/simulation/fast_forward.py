@@ -0,0 +1,99 @@
+import re
+
+
+class FastForwardCondition:
+    """
+    Decides when a fast-forward should end.
+
+    Each hook is called as the matching thing happens in the simulation, and returns True once the simulation should
+    return to real time.
+    """
+
+    description = "stopped"
+
+    def onTick(self, tick):
+        return False
+
+    def onEvent(self, robot_id, event_name, event_data):
+        return False
+
+    def onPrint(self, robot_id, message):
+        return False
+
+    def onTileCompleted(self, tile_index):
+        return False
+
+
+class UntilTick(FastForwardCondition):
+    """Stops after `ticks` more ticks have been simulated."""
+
+    def __init__(self, ticks):
+        self.remaining = ticks
+        self.description = f"{ticks} ticks"
+
+    def onTick(self, tick):
+        self.remaining -= 1
+        return self.remaining <= 0
+
+
+class UntilEvent(FastForwardCondition):
+    """Stops once an event such as ``GOAL_SCORED`` is sent to any bot."""
+
+    def __init__(self, event_name):
+        self.event_name = event_name
+        self.description = event_name
+
+    def onEvent(self, robot_id, event_name, event_data):
+        return event_name == self.event_name
+
+
+class UntilPrint(FastForwardCondition):
+    """Stops once a bot prints something matching the regular expression `pattern`."""
+
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+        self.description = f"a print matching {pattern}"
+
+    def onPrint(self, robot_id, message):
+        return self.pattern.search(message) is not None
+
+
+class UntilTileCompleted(FastForwardCondition):
+    """Stops once a rescue tile is completed."""
+
+    description = "a tile is completed"
+
+    def onTileCompleted(self, tile_index):
+        return True
+
+
+class UntilAny(FastForwardCondition):
+    """Stops as soon as any of `conditions` would."""
+
+    def __init__(self, *conditions):
+        self.conditions = conditions
+        self.description = " or ".join(condition.description for condition in conditions)
+
+    def onTick(self, tick):
+        return any([condition.onTick(tick) for condition in self.conditions])
+
+    def onEvent(self, robot_id, event_name, event_data):
+        return any([condition.onEvent(robot_id, event_name, event_data) for condition in self.conditions])
+
+    def onPrint(self, robot_id, message):
+        return any([condition.onPrint(robot_id, message) for condition in self.conditions])
+
+    def onTileCompleted(self, tile_index):
+        return any([condition.onTileCompleted(tile_index) for condition in self.conditions])
+
+
+class UntilInputsPlayed(FastForwardCondition):
+    """Stops once every recorded bot message has been played back."""
+
+    description = "the recorded bot messages run out"
+
+    def __init__(self, player):
+        self.player = player
+
+    def onTick(self, tick):
+        return self.player.finished
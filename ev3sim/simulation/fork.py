@@ -0,0 +1,79 @@
+import os
+import traceback
+from contextlib import nullcontext
+from multiprocessing import Pipe
+
+from ev3sim.simulation.loader import ScriptLoader, StateHandler
+from ev3sim.simulation.rewind import RewindBuffer
+
+
+def forkSimulation(variants, ticks, evaluate):
+    """
+    Evaluates what-if variants of the running simulation in parallel.
+
+    Each variant gets its own forked copy of this process, so it starts from the exact current state: the physics space,
+    device internals, interactor scores and timers, and the random number streams. The copies never talk to the bot
+    processes; instead each variant supplies its own inputs. Nor do they write to the parent's replay or input
+    recordings, or keep any rewind history.
+
+    Only the thread calling this exists in the copies, so variants can't draw, or use anything else that relies on the
+    parent's other threads, such as the bot queues. If the simulation runs on its own thread, every copy is forked
+    between two ticks, while holding ``StateHandler.sim_lock``.
+
+    :param variants: Callables, one per copy. Each is called as ``variant(tick)`` before every tick, and should apply
+        that copy's inputs (for example, writing motor speeds with ``applyWrite``).
+    :param int ticks: How many ticks to advance each copy.
+    :param evaluate: Called in each copy once it has finished. Its return value must be picklable.
+    :returns: The result of ``evaluate`` for each variant, in order.
+    :raises RuntimeError: If any variant raised an exception or exited without a result.
+    """
+    if not hasattr(os, "fork"):
+        raise NotImplementedError("Forking the simulation requires os.fork, which is not available on this platform.")
+    children = []
+    lock = StateHandler.instance.sim_lock if StateHandler.instance is not None else nullcontext()
+    with lock:
+        for variant in variants:
+            receiver, sender = Pipe(duplex=False)
+            pid = os.fork()
+            if pid == 0:
+                receiver.close()
+                runVariant(variant, ticks, evaluate, sender)
+            sender.close()
+            children.append((pid, receiver))
+    results = []
+    failures = []
+    for index, (pid, receiver) in enumerate(children):
+        try:
+            success, value = receiver.recv()
+        except EOFError:
+            success, value = False, "The process exited without a result."
+        receiver.close()
+        os.waitpid(pid, 0)
+        if success:
+            results.append(value)
+        else:
+            failures.append(f"Variant {index} failed:\n{value}")
+    if failures:
+        raise RuntimeError("\n".join(failures))
+    return results
+
+
+def runVariant(variant, ticks, evaluate, sender):
+    loader = ScriptLoader.instance
+    # The recordings' files are shared with the parent. Keeping the recorders referenced until exiting means their
+    # buffers are never flushed into them.
+    recordings = (loader.recorder, loader.input_recorder)
+    loader.recorder = None
+    loader.input_recorder = None
+    loader.rewind = RewindBuffer()
+    loader.rewind.SECONDS = 0
+    try:
+        for _ in range(ticks):
+            variant(loader.current_tick)
+            loader.simulation_tick(bot_io=False)
+        sender.send((True, evaluate()))
+    except BaseException:
+        sender.send((False, traceback.format_exc()))
+    finally:
+        # Skip the parent's exit handlers, which would tear down its window and bot processes.
+        os._exit(0)
@@ -0,0 +1,69 @@
+import json
+
+from ev3sim.simulation.replay import _encodeJson
+
+
+class InputRecorder:
+    """
+    Writes every message the bots send to the simulator, tagged with the physics tick it was handled on.
+
+    Together with the seed and batch in the header, this is enough to simulate the same match again without running
+    any bot code. The file is JSON lines: the header, then ``[tick, [[robot_id, message], ...]]`` for each tick with
+    messages, so a recording cut short is still readable up to its last full line.
+    """
+
+    def __init__(self, path, header):
+        self.file = open(path, "wb")
+        self.file.write(_encodeJson(header) + b"\n")
+        self.file.flush()
+        self.tick = None
+        self.messages = []
+
+    def recordMessage(self, tick, robot_id, message):
+        if tick != self.tick:
+            self.writeTick()
+            self.tick = tick
+        self.messages.append((robot_id, message))
+
+    def writeTick(self):
+        if self.messages:
+            self.file.write(_encodeJson([self.tick, self.messages]) + b"\n")
+            self.messages = []
+
+    def close(self):
+        self.writeTick()
+        self.file.close()
+
+
+class InputPlayer:
+    """Plays back a file written by :class:`InputRecorder`."""
+
+    def __init__(self, path):
+        self.ticks = []
+        with open(path, "rb") as f:
+            try:
+                self.header = json.loads(f.readline())
+            except ValueError:
+                self.header = None
+            if not isinstance(self.header, dict):
+                raise ValueError(f"{path} is not an ev3sim input recording.")
+            for line in f:
+                try:
+                    tick, messages = json.loads(line)
+                except ValueError:
+                    # A recording that was cut short.
+                    break
+                self.ticks.append((tick, messages))
+        self.position = 0
+
+    @property
+    def finished(self):
+        return self.position >= len(self.ticks)
+
+    def messagesAt(self, tick):
+        """Returns the (robot_id, message) pairs handled on or before `tick` that haven't been played yet."""
+        messages = []
+        while not self.finished and self.ticks[self.position][0] <= tick:
+            messages.extend(self.ticks[self.position][1])
+            self.position += 1
+        return messages
@@ -105,17 +105,21 @@ class IInteractor:
                 to_remove.append(i)
         for i in to_remove[::-1]:
             del ScriptLoader.instance.input_requests[i]
-        sim = ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM]
-        to_remove = []
-        for i, message in enumerate(sim.messages):
-            if isinstance(message[1], str) and message[1].startswith("input_Robot-"):
-                to_remove.append(i)
-            elif not (isinstance(message[1], str) and message[1].startswith("input")):
-                # Also remove any other messages that are not system input requests.
-                to_remove.append(i)
-        for i in to_remove[::-1]:
-            del sim.messages[i]
-        ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].regenerateObjects()
+
+        def clearMessages():
+            sim = ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM]
+            to_remove = []
+            for i, message in enumerate(sim.messages):
+                if isinstance(message[1], str) and message[1].startswith("input_Robot-"):
+                    to_remove.append(i)
+                elif not (isinstance(message[1], str) and message[1].startswith("input")):
+                    # Also remove any other messages that are not system input requests.
+                    to_remove.append(i)
+            for i in to_remove[::-1]:
+                del sim.messages[i]
+            sim.regenerateObjects()
+
+        ScreenObjectManager.instance.runOnMainThread(clearMessages)
 
     def handleInput(self, msg):
         pass
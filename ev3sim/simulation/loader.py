@@ -1,13 +1,21 @@
+import math
+import multiprocessing
+import os
+import threading
 import time
+from collections import deque
 from ev3sim.logging import Logger
 from ev3sim.settings import ObjectSetting, SettingsManager
 from queue import Empty
-from multiprocessing import Process
 from typing import List
 
 from ev3sim.objects.base import objectFactory
 from ev3sim.simulation.bot_comms import BotCommService
+from ev3sim.simulation.bot_cpu import BotCpuUsage
+from ev3sim.simulation.bot_thread import BotThread, ThreadQueue
+from ev3sim.simulation.code_cache import cache_directory, compile_mindstorms, mindstorms_path
 from ev3sim.simulation.interactor import IInteractor, fromOptions
+from ev3sim.simulation.rewind import RewindBuffer
 from ev3sim.simulation.world import World, stop_on_pause
 from ev3sim.visual.manager import ScreenObjectManager, screen_settings
 from ev3sim.visual.objects import visualFactory
@@ -15,6 +23,7 @@ import ev3sim.visual.utils
 from ev3sim.constants import *
 from ev3sim.search_locations import bot_locations
 from ev3sim.file_helper import ensure_workspace_filled, find_abs, find_abs_directory, WorkspaceError
+from ev3sim.utils import wait_for_queues
 
 
 class ScriptLoader:
@@ -31,6 +40,24 @@ class ScriptLoader:
     TIME_SCALE = 1
 
     RANDOMISE_SENSORS = False
+    # Save a replay of every simulation to the `replays` folder.
+    RECORD_REPLAYS = False
+    # Save every message the bots send, so the match can be simulated again without them.
+    RECORD_INPUTS = False
+    # CPU milliseconds each bot may use per tick before its following ticks are held back. 0 means no limit.
+    BOT_CPU_BUDGET_MS = 0
+    # Run bots one at a time in a fixed order, each until it waits for the next tick, so results don't depend on timing.
+    LOCKSTEP_BOTS = False
+    # How long a bot may take over a tick in lockstep before the simulation moves on without it.
+    LOCKSTEP_TIMEOUT = 2
+    # How bot processes are started. "fork" copies the whole simulator, including the window and physics, into every
+    # bot, whereas "forkserver" starts them from a process that has only loaded what bots need.
+    BOT_START_METHOD = "forkserver"
+    BOT_PRELOAD = ["ev3sim.attach_bot", "ev3sim.code_helpers", "ev3dev2.motor", "ev3dev2.sensor.lego", "numpy"]
+    # Run bots marked `trusted` in their config on threads of the simulator's process, which saves passing every
+    # message between processes. Their code isn't isolated from the simulator, or from each other, so this is only for
+    # code you trust. Bots on threads always take turns, as in lockstep.
+    THREAD_TRUSTED_BOTS = False
 
     instance: "ScriptLoader" = None
     running = True
@@ -41,10 +68,24 @@ class ScriptLoader:
         self.queues = {}
         self.processes = {}
         self.scriptnames = {}
+        self.trusted = {}
         self.outstanding_events = {}
+        self.cpu_usage = {}
+        self.finished_ticks = {}
+        self.messages_read = {}
+        self.sent_before_start = {}
         self.comms = BotCommService()
+        self.bot_context = multiprocessing.get_context()
+        # Mindstorms projects being compiled, and the bots waiting for theirs before they can start.
+        self.compiling = {}
+        self.waiting_for_compile = set()
         self.active_scripts = []
         self.all_scripts = []
+        self.fast_forward = None
+        self.rewind = RewindBuffer()
+        self.recorder = None
+        self.input_recorder = None
+        self.input_player = None
 
     def reset(self):
         for script in self.all_scripts:
@@ -55,6 +96,17 @@ class ScriptLoader:
         self.all_scripts = []
         self.robots = {}
         self.scriptnames = {}
+        self.trusted = {}
+        self.cpu_usage = {}
+        self.finished_ticks = {}
+        self.messages_read = {}
+        self.sent_before_start = {}
+        self.waiting_for_compile = set()
+        self.comms = BotCommService()
+        self.fast_forward = None
+        self.rewind.reset()
+        self.stopRecording()
+        self.input_player = None
 
     def startProcess(self, robot_id, kill_recent=True):
         if robot_id in self.processes and self.processes[robot_id] is not None:
@@ -62,24 +114,36 @@ class ScriptLoader:
                 self.killProcess(robot_id)
             else:
                 raise ValueError("Did not expect an existing process!")
+        self.cpu_usage[robot_id] = BotCpuUsage()
+        self.finished_ticks[robot_id] = None
+        self.messages_read[robot_id] = None
+        if self.input_player is not None:
+            # The recorded messages stand in for the bots.
+            return
         if self.scriptnames[robot_id] is not None:
-            from os.path import join, split, dirname
+            from os.path import split
             from ev3sim.attach_bot import attach_bot
 
             if self.scriptnames[robot_id].endswith(".ev3"):
-                actual_script = join(dirname(self.scriptnames[robot_id]), ".compiled.py")
-                try:
-                    from mindpile import from_ev3
-
-                    with open(actual_script, "w") as f:
-                        f.write(from_ev3(self.scriptnames[robot_id], ev3sim_support=True))
-                except Exception as e:
-                    with open(actual_script, "w") as f:
-                        f.write(f'print("Mindstorms compilation failed! {e}")')
+                compiling = self.compiling.get(self.scriptnames[robot_id])
+                if compiling is not None and not compiling.done():
+                    # pollCompiles starts the bot once it has compiled.
+                    self.waiting_for_compile.add(robot_id)
+                    return
+                actual_script = None
+                if compiling is not None:
+                    del self.compiling[self.scriptnames[robot_id]]
+                    try:
+                        actual_script = compiling.result()
+                    except Exception:
+                        # The pool couldn't run it, so compile it here instead.
+                        pass
+                if actual_script is None:
+                    actual_script = compile_mindstorms(self.scriptnames[robot_id], cache_directory("mindstorms"))
             else:
                 actual_script = self.scriptnames[robot_id]
 
-            format_filename = join(actual_script)
+            format_filename = self.scriptnames[robot_id]
             # This ensures that as long as the code sits in the bot directory, relative imports will work fine.
             possible_locations = ["workspace/robots/", "workspace", "package/examples/robots"]
             extra_dirs = []
@@ -93,23 +157,87 @@ class ScriptLoader:
             else:
                 raise ValueError(f"Expected code to be in one of the following locations: {possible_locations}")
 
-            self.processes[robot_id] = Process(
-                target=attach_bot,
-                args=(
-                    robot_id,
-                    actual_script,
-                    extra_dirs[::-1],
-                    StateHandler.instance.shared_info["result_queue"],
-                    StateHandler.instance.shared_info["result_queue"]._internal_size,
-                    self.queues[robot_id][self.SEND],
-                    self.queues[robot_id][self.SEND]._internal_size,
-                    self.queues[robot_id][self.RECV],
-                    self.queues[robot_id][self.RECV]._internal_size,
-                ),
+            threaded = self.THREAD_TRUSTED_BOTS and self.trusted.get(robot_id, False)
+            if threaded and not isinstance(self.queues[robot_id][self.SEND], ThreadQueue):
+                self.queues[robot_id] = (ThreadQueue(), ThreadQueue())
+            # The new bot only counts what it reads from here on.
+            self.sent_before_start[robot_id] = self.queues[robot_id][self.SEND].put_count
+            args = (
+                actual_script,
+                extra_dirs[::-1],
+                StateHandler.instance.shared_info["result_queue"],
+                StateHandler.instance.shared_info["result_queue"]._internal_size,
+                self.queues[robot_id][self.SEND],
+                self.queues[robot_id][self.SEND]._internal_size,
+                self.queues[robot_id][self.RECV],
+                self.queues[robot_id][self.RECV]._internal_size,
+                cache_directory("bytecode"),
             )
+            if threaded:
+                self.processes[robot_id] = BotThread(robot_id, args)
+            else:
+                self.processes[robot_id] = self.bot_context.Process(target=attach_bot, args=(robot_id,) + args)
             self.processes[robot_id].start()
             Logger.instance.beginLog(robot_id)
 
+    @classmethod
+    def botContext(cls):
+        """The multiprocessing context to start bots with, which the queues shared with them must also come from."""
+        if cls.BOT_START_METHOD not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context()
+        context = multiprocessing.get_context(cls.BOT_START_METHOD)
+        if cls.BOT_START_METHOD == "forkserver":
+            # Only has an effect until the server has started.
+            context.set_forkserver_preload(cls.BOT_PRELOAD)
+        return context
+
+    def botMemory(self, robot_id):
+        """The bot process's proportional set size in bytes, with shared pages split between their users, if known."""
+        process = self.processes.get(robot_id)
+        if process is None or process.pid is None:
+            return None
+        try:
+            with open(f"/proc/{process.pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def compileMindstorms(self):
+        """
+        Starts compiling every Mindstorms project that isn't cached yet in a process pool, without waiting for them.
+        Bots whose project is still compiling start from pollCompiles once it is done.
+        """
+        cache_dir = cache_directory("mindstorms")
+        projects = {script for script in self.scriptnames.values() if script is not None and script.endswith(".ev3")}
+        uncached = [
+            project
+            for project in projects
+            if project not in self.compiling
+            and (cache_dir is None or not os.path.exists(mindstorms_path(project, cache_dir)))
+        ]
+        if not uncached:
+            return
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(min(len(uncached), os.cpu_count() or 1), mp_context=self.botContext())
+        for project in uncached:
+            self.compiling[project] = pool.submit(compile_mindstorms, project, cache_dir)
+        # The workers exit once everything submitted has compiled.
+        pool.shutdown(wait=False)
+
+    def pollCompiles(self):
+        """Starts the bots that were waiting for their Mindstorms project, once it has compiled."""
+        for robot_id in sorted(self.waiting_for_compile):
+            compiling = self.compiling.get(self.scriptnames.get(robot_id))
+            if compiling is None or compiling.done():
+                self.waiting_for_compile.discard(robot_id)
+                # Clear out the ticks sent while it was waiting.
+                self.killProcess(robot_id)
+                self.startProcess(robot_id)
+
     def killProcess(self, robot_id, allow_empty=True):
         if robot_id in self.processes and self.processes[robot_id] is not None:
             self.processes[robot_id].terminate()
@@ -119,12 +247,8 @@ class ScriptLoader:
         elif not allow_empty:
             raise ValueError("Expected an existing process!")
         # Clear all the robot queues. Do this regardless of whether the process existed.
-        for key in (ScriptLoader.instance.SEND, ScriptLoader.instance.RECV):
-            while True:
-                try:
-                    ScriptLoader.instance.queues[robot_id][key].get_nowait()
-                except (Empty, KeyError):
-                    break
+        for queue in ScriptLoader.instance.queues.get(robot_id, ()):
+            queue.get_all()
 
     def killAllProcesses(self):
         for rob_id in self.robots:
@@ -141,6 +265,101 @@ class ScriptLoader:
 
     def sendEvent(self, botID, eventName, eventData):
         self.outstanding_events[botID].append((eventName, eventData))
+        if self.recorder is not None:
+            self.recorder.recordEvent(botID, eventName, eventData)
+        self.checkFastForward("onEvent", botID, eventName, eventData)
+
+    def recordingFilename(self, extension):
+        import datetime
+        from os.path import join
+
+        if StateHandler.WORKSPACE_FOLDER:
+            replay_dir = find_abs_directory("workspace/replays/", create=True)
+        else:
+            replay_dir = find_abs_directory("package/replays/", create=True)
+        return join(replay_dir, f"{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}{extension}")
+
+    def startRecording(self):
+        from ev3sim.simulation.replay import ReplayRecorder
+
+        manager = ScreenObjectManager.instance
+        self.recorder = ReplayRecorder(
+            self.recordingFilename(".ev3rec"),
+            {
+                "tick_rate": self.GAME_TICK_RATE,
+                "colours": ev3sim.visual.utils.GLOBAL_COLOURS,
+                "screen": {
+                    "MAP_WIDTH": manager.MAP_WIDTH,
+                    "MAP_HEIGHT": manager.MAP_HEIGHT,
+                    "BACKGROUND_COLOUR": manager.BACKGROUND_COLOUR,
+                },
+            },
+        )
+
+    def startInputRecording(self, batch, seed):
+        from ev3sim.simulation.input_replay import InputRecorder
+
+        self.input_recorder = InputRecorder(self.recordingFilename(".ev3in"), {"batch": batch, "seed": seed})
+
+    def playInputs(self, player):
+        """
+        Simulate using the bot messages recorded by `player` rather than running the bots, as fast as possible.
+
+        :param ev3sim.simulation.input_replay.InputPlayer player: The recording to play.
+        """
+        from ev3sim.simulation.fast_forward import UntilInputsPlayed
+
+        self.input_player = player
+        self.fastForward(UntilInputsPlayed(player))
+
+    def stopRecording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.input_recorder is not None:
+            self.input_recorder.close()
+            self.input_recorder = None
+
+    def fastForward(self, condition):
+        """
+        Simulate as fast as possible, without drawing, until `condition` fires. Then return to real time.
+
+        :param ev3sim.simulation.fast_forward.FastForwardCondition condition: Decides when to stop.
+        """
+        self.fast_forward = condition
+        self.printSystemMessage(f"Fast forwarding until {condition.description}.")
+
+    def stopFastForward(self):
+        if self.fast_forward is not None:
+            self.printSystemMessage("Fast forward finished, back to real time.")
+        self.fast_forward = None
+
+    def checkFastForward(self, hook, *args):
+        if self.fast_forward is not None and getattr(self.fast_forward, hook)(*args):
+            self.stopFastForward()
+
+    def printBotStats(self):
+        for robot_id, usage in self.cpu_usage.items():
+            send_queue, recv_queue = self.queues[robot_id]
+            memory = self.botMemory(robot_id)
+            self.printSystemMessage(
+                f"{robot_id} used {usage.perTick * 1000:.2f}ms of CPU per tick, {usage.delayed_ticks} ticks held back. "
+                f"Sent {send_queue.put_count} messages, received {recv_queue.get_count}."
+                + (f" Using {memory / 2 ** 20:.1f}MB of memory." if memory is not None else "")
+            )
+        for connection in self.comms.connections:
+            if connection is not None:
+                self.printSystemMessage(
+                    f"Connection {connection.index} between {connection.host_id} and {connection.client_id} delivered "
+                    f"{connection.messages} messages ({connection.bytes} bytes), taking {connection.meanLatency:.1f} "
+                    f"ticks on average and {connection.max_latency} at most. {connection.backlog} are still waiting."
+                )
+
+    def printSystemMessage(self, message):
+        ScreenObjectManager.instance.runOnMainThread(
+            ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].printStyledMessage,
+            f"[System] {message}",
+        )
 
     def setRobotQueues(self, botID, sendQ, recvQ):
         self.queues[botID] = (sendQ, recvQ)
@@ -190,83 +409,175 @@ class ScriptLoader:
     def incrementPhysicsTick(self):
         self.physics_tick += 1
 
-    def handleWrites(self):
-        for rob_id in self.robots:
-            r_queue = self.queues[rob_id][self.RECV]
-            while True:
-                try:
-                    write_type, data = r_queue.get_nowait()
-                    if write_type == DEVICE_WRITE:
-                        attribute_path, value = data
-                        sensor_type, specific_sensor, attribute = attribute_path.split()
-                        self.robots[rob_id].getDeviceFromPath(sensor_type, specific_sensor).applyWrite(attribute, value)
-                    elif write_type == START_SERVER:
-                        self.comms.startServer(data["connection_string"], data["robot_id"])
-                    elif write_type == CLOSE_SERVER:
-                        self.comms.closeServer(data["connection_string"], data["robot_id"])
-                    elif write_type == JOIN_CLIENT:
-                        self.comms.attemptConnectToServer(data["robot_id"], data["connection_string"])
-                    elif write_type == CLOSE_CLIENT:
-                        self.comms.closeClient(data["connection_string"], data["robot_id"])
-                    elif write_type == SEND_DATA:
-                        self.comms.handleSend(
-                            data["robot_id"], data["send_to"], data["connection_string"], data["data"]
-                        )
-                    elif write_type == MESSAGE_PRINT:
-                        Logger.instance.writeMessage(data["robot_id"], data["data"], **data.get("kwargs", {}))
-
-                        class Event:
-                            pass
-
-                        event = Event()
-                        event.type = EV3SIM_PRINT
-                        event.robot_id = data["robot_id"]
-                        event.message = data["data"]
-                        ScreenObjectManager.instance.unhandled_events.append(event)
-                    elif write_type == MESSAGE_INPUT_REQUESTED:
-                        self.requestInput(data["robot_id"], data["message"])
-                    elif write_type == BOT_COMMAND:
-
-                        class Event:
-                            pass
-
-                        event = Event()
-                        event.type = EV3SIM_BOT_COMMAND
-                        event.command_type = data["command_type"]
-                        event.robot_id = data["robot_id"]
-                        event.payload = data["payload"]
-                        ScreenObjectManager.instance.unhandled_events.append(event)
-                except Empty:
-                    break
+    def botMessages(self, robot_ids):
+        """Yields (robot_id, message) for every message sent by the bots since the last tick."""
+        if self.input_player is not None:
+            yield from self.input_player.messagesAt(self.physics_tick)
+            return
+        for rob_id in robot_ids:
+            for message in self.queues[rob_id][self.RECV].get_all():
+                if self.input_recorder is not None:
+                    self.input_recorder.recordMessage(self.physics_tick, rob_id, message)
+                yield rob_id, message
+
+    def lockstep(self):
+        """Whether bots take turns each tick, rather than running alongside the simulation."""
+        if self.input_player is not None:
+            return False
+        return self.LOCKSTEP_BOTS or any(isinstance(process, BotThread) for process in self.processes.values())
+
+    def liveBotQueues(self):
+        """The queues bots write to, if their messages can be handled whenever they arrive rather than once per tick."""
+        if self.input_player is not None or self.lockstep():
+            return []
+        return [self.queues[rob_id][self.RECV] for rob_id in self.robots]
+
+    def handleWrites(self, robot_ids=None):
+        for rob_id, (write_type, data) in self.botMessages(self.robots if robot_ids is None else robot_ids):
+            if write_type == DEVICE_WRITE:
+                attribute_path, value = data
+                sensor_type, specific_sensor, attribute = attribute_path.split()
+                self.robots[rob_id].getDeviceFromPath(sensor_type, specific_sensor).applyWrite(attribute, value)
+            elif write_type == START_SERVER:
+                self.comms.startServer(data["connection_string"], data["robot_id"])
+            elif write_type == CLOSE_SERVER:
+                self.comms.closeServer(data["connection_string"], data["robot_id"])
+            elif write_type == JOIN_CLIENT:
+                self.comms.attemptConnectToServer(data["robot_id"], data["connection_string"])
+            elif write_type == CLOSE_CLIENT:
+                self.comms.closeClient(data["connection"], data["robot_id"])
+            elif write_type == SEND_DATA:
+                self.comms.handleSend(
+                    data["robot_id"], data["connection"], data["data"], data["tick"], self.physics_tick
+                )
+            elif write_type == MESSAGE_PRINT:
+                Logger.instance.writeMessage(data["robot_id"], data["data"], **data.get("kwargs", {}))
+                self.checkFastForward("onPrint", data["robot_id"], data["data"])
+
+                class Event:
+                    pass
+
+                event = Event()
+                event.type = EV3SIM_PRINT
+                event.robot_id = data["robot_id"]
+                event.message = data["data"]
+                ScreenObjectManager.instance.unhandled_events.append(event)
+            elif write_type == MESSAGE_INPUT_REQUESTED:
+                self.requestInput(data["robot_id"], data["message"])
+            elif write_type == TICK_FINISHED:
+                self.cpu_usage[rob_id].report(data["cpu_time"])
+                self.finished_ticks[rob_id] = data["tick"]
+                self.messages_read[rob_id] = data.get("read")
+            elif write_type == BOT_COMMAND:
+
+                class Event:
+                    pass
+
+                event = Event()
+                event.type = EV3SIM_BOT_COMMAND
+                event.command_type = data["command_type"]
+                event.robot_id = data["robot_id"]
+                event.payload = data["payload"]
+                ScreenObjectManager.instance.unhandled_events.append(event)
 
     # Maximum amount of times simulation will push data without it being handled.
     MAX_DEAD_SENDS = 10
 
     def setValues(self):
-        for key, robot in self.robots.items():
-            s_queue = self.queues[key][self.SEND]
-            good = True
-            if s_queue.qsize() > self.MAX_DEAD_SENDS:
-                good = False
-            if (not good) or (not robot.spawned):
+        if self.input_player is not None:
+            # There are no bots to read the values.
+            return
+        for key in self.robots:
+            self.sendValues(key)
+
+    def sendValues(self, key):
+        """Sends the current tick to a bot, returning whether it was sent."""
+        robot = self.robots[key]
+        s_queue = self.queues[key][self.SEND]
+        good = True
+        if s_queue.qsize() > self.MAX_DEAD_SENDS:
+            good = False
+        if (not good) or (not robot.spawned):
+            return False
+        usage = self.cpu_usage.get(key)
+        if usage is not None and not usage.allowTick(self.BOT_CPU_BUDGET_MS / 1000):
+            return False
+        info = {
+            "tick": self.physics_tick,
+            "tick_rate": self.GAME_TICK_RATE,
+            "events": self.outstanding_events[key],
+            "data": robot._interactor.collectDeviceData(),
+        }
+        self.outstanding_events[key] = []
+        s_queue.put((SIM_DATA, info))
+        return True
+
+    def lockstepBots(self):
+        """
+        Gives each bot a turn, in a fixed order. A bot is sent the current tick, and its writes are handled until it is
+        waiting for the next tick with nothing left to read. It is then told its turn is over, and until its next turn
+        it only keeps what it is sent, so other bots' turns can't wake it.
+        """
+        for key in sorted(self.robots):
+            process = self.processes.get(key)
+            # A bot that wasn't sent anything is still waiting for its turn.
+            if process is None or not self.sendValues(key):
                 continue
-            info = {
-                "tick": self.physics_tick,
-                "tick_rate": self.GAME_TICK_RATE,
-                "events": self.outstanding_events[key],
-                "data": robot._interactor.collectDeviceData(),
-            }
-            self.outstanding_events[key] = []
-            s_queue.put((SIM_DATA, info))
+            if isinstance(process, BotThread):
+                self.threadTurn(key, process)
+            else:
+                self.processTurn(key, process)
+            self.queues[key][self.SEND].put((TURN_OVER, {}))
+
+    def botWaiting(self, key):
+        """Whether a bot is waiting for the next tick, having read everything sent to it, so nothing will wake it."""
+        finished = self.finished_ticks.get(key)
+        if finished is None or finished < self.physics_tick:
+            return False
+        sent = self.queues[key][self.SEND].put_count - self.sent_before_start.get(key, 0)
+        return self.messages_read.get(key) == sent
+
+    def processTurn(self, key, process):
+        deadline = time.time() + self.LOCKSTEP_TIMEOUT
+        while True:
+            self.handleWrites([key])
+            if self.botWaiting(key) or not process.is_alive():
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.printSystemMessage(f"{key} took more than {self.LOCKSTEP_TIMEOUT}s over a tick, skipping it.")
+                break
+            wait_for_queues([self.queues[key][self.RECV]], remaining)
+
+    def threadTurn(self, key, process):
+        # A bot on a thread hands back control whenever it waits for the simulator, which might be before it is done
+        # with this tick.
+        deadline = time.time() + self.LOCKSTEP_TIMEOUT
+        while True:
+            waiting = process.runTurn(max(deadline - time.time(), 0))
+            self.handleWrites([key])
+            if self.botWaiting(key) or not process.is_alive():
+                break
+            if not waiting:
+                self.printSystemMessage(f"{key} took more than {self.LOCKSTEP_TIMEOUT}s over a tick, skipping it.")
+                break
 
     def handleEvents(self, events):
         for event in events:
             for interactor in self.active_scripts:
                 interactor.handleEvent(event)
 
-    def simulation_tick(self):
-        self.handleWrites()
-        self.setValues()
+    def simulation_tick(self, bot_io=True):
+        # Sensors read this tick's surface however often frames are drawn, so they don't change with frame timing.
+        ScreenObjectManager.instance.renderSensorScreen()
+        if bot_io:
+            if self.lockstep():
+                self.comms.tick(self.physics_tick)
+                self.lockstepBots()
+            else:
+                self.handleWrites()
+                self.comms.tick(self.physics_tick)
+                self.setValues()
         to_remove = []
         for i, interactor in enumerate(self.active_scripts):
             if interactor.tick(self.current_tick):
@@ -279,6 +590,12 @@ class ScriptLoader:
             interactor.afterPhysics()
         self.incrementPhysicsTick()
         self.current_tick += 1
+        if not World.instance.paused:
+            # Pausing also leaves the history alone while it is being viewed.
+            self.rewind.record(self.physics_tick, self.GAME_TICK_RATE, ScreenObjectManager.instance.objects)
+            if self.recorder is not None:
+                self.recorder.recordTick(self.physics_tick, ScreenObjectManager.instance.objects)
+        self.checkFastForward("onTick", self.current_tick)
 
     def consumeMessage(self, message, output):
         if isinstance(output, IInteractor):
@@ -287,14 +604,17 @@ class ScriptLoader:
             # Assumed to be robot id.
             self.queues[output][self.SEND].put((SIM_INPUT, message))
         # If there is a prompt being shown in console, remove it.
-        sim = ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM]
-        to_remove = []
-        for i, message in enumerate(sim.messages):
-            if message[1] == f"input_{str(output)}":
-                to_remove.append(i)
-        for index in to_remove[::-1]:
-            del sim.messages[index]
-        sim.regenerateObjects()
+        def removePrompt():
+            sim = ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM]
+            to_remove = []
+            for i, message in enumerate(sim.messages):
+                if message[1] == f"input_{str(output)}":
+                    to_remove.append(i)
+            for index in to_remove[::-1]:
+                del sim.messages[index]
+            sim.regenerateObjects()
+
+        ScreenObjectManager.instance.runOnMainThread(removePrompt)
 
     def postInput(self, message, preffered_output=None):
         # First, try to grab an existing request from the queue.
@@ -326,13 +646,16 @@ class ScriptLoader:
             self.input_requests.append(output)
             if message is not None:
                 preamble = "[System] " if isinstance(output, IInteractor) else f"[{output}] "
-                ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].printStyledMessage(
+                ScreenObjectManager.instance.runOnMainThread(
+                    ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].printStyledMessage,
                     preamble + message,
                     alive_id=f"input_{str(output)}",
                     push_to_front=True,
                 )
         if len(self.input_requests) > 0:
-            ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].regenerateObjects()
+            ScreenObjectManager.instance.runOnMainThread(
+                ScreenObjectManager.instance.screens[ScreenObjectManager.instance.SCREEN_SIM].regenerateObjects
+            )
 
 
 class WorkspaceSetting(ObjectSetting):
@@ -356,8 +679,27 @@ class StateHandler:
     WORKSPACE_FOLDER = None
     SEND_CRASH_REPORTS = None
 
+    # Run the simulation on its own thread, so that drawing never holds up ticks.
+    DECOUPLED_RENDERING = False
+    # How many ticks the decoupled simulation will run back to back to catch up before dropping time instead.
+    MAX_CATCHUP_TICKS = 5
+    # Above a time scale of 1, frames are skipped so drawing doesn't starve the ticks, but never below this rate. Only
+    # what is shown is skipped, sensors see every tick.
+    MIN_FRAME_RATE = 2
+    # Weight given to the newest measurement in the running tick and frame costs.
+    COST_SMOOTHING = 0.1
+    # While fast forwarding, only handle events and draw this often.
+    FAST_FORWARD_FRAME_PERIOD = 0.5
+
     def __init__(self):
         StateHandler.instance = self
+        self.tick_cost = 0
+        self.frame_cost = 0
+        # Guards simulation state whenever the simulation and drawing run on separate threads.
+        self.sim_lock = threading.RLock()
+        self.sim_thread = None
+        # Calls waiting for the simulation thread, made while handling events.
+        self.sim_calls = deque()
         sl = ScriptLoader()
         world = World()
         logger = Logger()
@@ -366,6 +708,19 @@ class StateHandler:
             "FPS": ObjectSetting(ScriptLoader, "VISUAL_TICK_RATE"),
             "tick_rate": ObjectSetting(ScriptLoader, "GAME_TICK_RATE"),
             "timescale": ObjectSetting(ScriptLoader, "TIME_SCALE"),
+            "physics_profile": ObjectSetting(World, "PHYSICS_PROFILE"),
+            "threaded_physics": ObjectSetting(World, "THREADED_PHYSICS"),
+            "decoupled_rendering": ObjectSetting(StateHandler, "DECOUPLED_RENDERING"),
+            "rewind_seconds": ObjectSetting(RewindBuffer, "SECONDS"),
+            "record_replays": ObjectSetting(ScriptLoader, "RECORD_REPLAYS"),
+            "record_inputs": ObjectSetting(ScriptLoader, "RECORD_INPUTS"),
+            "bot_cpu_budget_ms": ObjectSetting(ScriptLoader, "BOT_CPU_BUDGET_MS"),
+            "lockstep_bots": ObjectSetting(ScriptLoader, "LOCKSTEP_BOTS"),
+            "bot_start_method": ObjectSetting(ScriptLoader, "BOT_START_METHOD"),
+            "thread_trusted_bots": ObjectSetting(ScriptLoader, "THREAD_TRUSTED_BOTS"),
+            "comms_latency_ticks": ObjectSetting(BotCommService, "LINK_LATENCY_TICKS"),
+            "comms_bytes_per_tick": ObjectSetting(BotCommService, "LINK_BYTES_PER_TICK"),
+            "comms_queue_limit": ObjectSetting(BotCommService, "LINK_QUEUE_LIMIT"),
             "console_log": ObjectSetting(Logger, "LOG_CONSOLE"),
             "workspace_folder": WorkspaceSetting(StateHandler, "WORKSPACE_FOLDER"),
             "send_crash_reports": ObjectSetting(StateHandler, "SEND_CRASH_REPORTS"),
@@ -375,13 +730,10 @@ class StateHandler:
         self.shared_info = {}
 
     def closeProcesses(self):
+        ScriptLoader.instance.stopRecording()
         ScriptLoader.instance.killAllProcesses()
         # Clear the result queue.
-        while True:
-            try:
-                self.shared_info["result_queue"].get_nowait()
-            except Empty:
-                break
+        self.shared_info["result_queue"].get_all()
 
     def setConfig(self, **kwargs):
         SettingsManager.instance.setMany(kwargs)
@@ -396,48 +748,193 @@ class StateHandler:
 
         start_batch(batch, seed=seed)
 
+    def pollResults(self):
+        ScriptLoader.instance.pollCompiles()
+        try:
+            r = self.shared_info["result_queue"].get_nowait()
+            if r is not True:
+                Logger.instance.reportError(r[0], r[1])
+        except Empty:
+            pass
+
+    def ticksPerFrame(self):
+        """How many ticks should run between drawn frames, given the measured cost of each."""
+        if ScriptLoader.instance.TIME_SCALE <= 1:
+            return 1
+        spare = 1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE - self.tick_cost
+        if spare <= 0:
+            # Ticks alone use all the time, so only MIN_FRAME_RATE will let a frame through.
+            return math.inf
+        return max(1, math.ceil(self.frame_cost / spare))
+
+    def waitForBots(self, deadline):
+        """
+        Sleeps until `deadline`, rather than spinning. Anything the bots send in the meantime is handled as it arrives,
+        so bots waiting for their writes to be read can carry on sooner.
+        """
+        while True:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return
+            result_queue = self.shared_info.get("result_queue")
+            if not self.is_simulating or result_queue is None:
+                time.sleep(timeout)
+                return
+            ready = wait_for_queues(ScriptLoader.instance.liveBotQueues() + [result_queue], timeout)
+            if not ready:
+                return
+            with self.sim_lock:
+                if result_queue in ready:
+                    self.pollResults()
+                if any(queue is not result_queue for queue in ready):
+                    ScriptLoader.instance.handleWrites()
+
     def mainLoop(self):
+        if self.DECOUPLED_RENDERING:
+            self.decoupledLoop()
+            return
         last_vis_update = time.time() - 1.1 / ScriptLoader.instance.VISUAL_TICK_RATE
         last_game_update = time.time() - 1.1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
         total_lag_ticks = 0
         lag_printed = False
+        ticks_since_frame = 0
         while self.is_running:
             try:
                 new_time = time.time()
+                tick_period = 1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
+                fast_forwarding = self.is_simulating and ScriptLoader.instance.fast_forward is not None
                 if self.is_simulating:
-                    if (
-                        new_time - last_game_update
-                        > 1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
-                    ):
+                    if fast_forwarding or new_time - last_game_update > tick_period:
                         ScriptLoader.instance.simulation_tick()
-                        if (
-                            new_time - last_game_update
-                            > 2 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
-                        ):
+                        ScreenObjectManager.instance.recordPoses()
+                        ticks_since_frame += 1
+                        self.tick_cost += (time.time() - new_time - self.tick_cost) * self.COST_SMOOTHING
+                        if new_time - last_game_update > 2 * tick_period:
                             total_lag_ticks += 1
-                        last_game_update = new_time
+                        # Waking a little late shouldn't slow the simulation down, but don't bank more than a tick.
+                        last_game_update = max(last_game_update + tick_period, new_time - tick_period)
                         if (
                             ScriptLoader.instance.current_tick > 10
                             and total_lag_ticks / ScriptLoader.instance.current_tick > 0.5
                         ) and not lag_printed:
                             lag_printed = True
                             print("The simulation is currently lagging, you may want to turn down the game tick rate.")
-                    try:
-                        r = self.shared_info["result_queue"].get_nowait()
-                        if r is not True:
-                            Logger.instance.reportError(r[0], r[1])
-                    except Empty:
-                        pass
-                if new_time - last_vis_update > 1 / ScriptLoader.instance.VISUAL_TICK_RATE:
+                    self.pollResults()
+                if fast_forwarding:
+                    frame_due = new_time - last_vis_update > self.FAST_FORWARD_FRAME_PERIOD
+                else:
+                    frame_due = new_time - last_vis_update > 1 / ScriptLoader.instance.VISUAL_TICK_RATE and (
+                        not self.is_simulating
+                        or ticks_since_frame >= self.ticksPerFrame()
+                        or new_time - last_vis_update > 1 / self.MIN_FRAME_RATE
+                    )
+                if frame_due:
                     last_vis_update = new_time
+                    ticks_since_frame = 0
+                    frame_start = time.time()
                     events = ScreenObjectManager.instance.handleEvents()
                     if self.is_running:
                         # We might've closed with those events.
                         if self.is_simulating:
                             ScriptLoader.instance.handleEvents(events)
                         ScreenObjectManager.instance.applyToScreen()
+                    self.frame_cost += (time.time() - frame_start - self.frame_cost) * self.COST_SMOOTHING
+                if not fast_forwarding:
+                    wake_at = last_vis_update + 1 / ScriptLoader.instance.VISUAL_TICK_RATE
+                    if self.is_simulating:
+                        next_tick = last_game_update + tick_period
+                        # A late frame is being skipped in favour of ticks, so only the next tick matters.
+                        wake_at = next_tick if wake_at < time.time() else min(wake_at, next_tick)
+                    self.waitForBots(wake_at)
+            except WorkspaceError:
+                pass
+
+    def runOnSimThread(self, func, *args, **kwargs):
+        """Calls `func` now, unless the simulation is ticking on its own thread, in which case it runs before the next tick."""
+        if self.sim_thread is None or threading.current_thread() is self.sim_thread:
+            func(*args, **kwargs)
+        else:
+            self.sim_calls.append((func, args, kwargs))
+
+    def runSimCalls(self):
+        while self.sim_calls:
+            func, args, kwargs = self.sim_calls.popleft()
+            func(*args, **kwargs)
+
+    def decoupledLoop(self):
+        """Ticks the simulation on a worker thread, while this thread handles events and draws published snapshots."""
+        self.sim_error = None
+        self.sim_thread = threading.Thread(target=self.simulationLoop, daemon=True)
+        self.sim_thread.start()
+        last_vis_update = time.time() - 1.1 / ScriptLoader.instance.VISUAL_TICK_RATE
+        try:
+            while self.is_running:
+                if self.sim_error is not None:
+                    raise self.sim_error
+                new_time = time.time()
+                if self.is_simulating and ScriptLoader.instance.fast_forward is not None:
+                    frame_period = self.FAST_FORWARD_FRAME_PERIOD
+                else:
+                    frame_period = 1 / ScriptLoader.instance.VISUAL_TICK_RATE
+                if new_time - last_vis_update < frame_period:
+                    time.sleep(frame_period - (new_time - last_vis_update))
+                    continue
+                last_vis_update = new_time
+                try:
+                    events = ScreenObjectManager.instance.handleEvents()
+                    if self.is_running and self.is_simulating:
+                        self.runOnSimThread(ScriptLoader.instance.handleEvents, events)
+                    if self.is_running:
+                        ScreenObjectManager.instance.applyToScreen()
+                except WorkspaceError:
+                    pass
+        finally:
+            self.is_running = False
+            self.sim_thread.join()
+            self.sim_thread = None
+            self.runSimCalls()
+
+    def simulationLoop(self):
+        last_game_update = time.time()
+        total_lag_ticks = 0
+        lag_printed = False
+        while self.is_running:
+            tick_period = 1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
+            new_time = time.time()
+            fast_forwarding = ScriptLoader.instance.fast_forward is not None
+            if not fast_forwarding and new_time - last_game_update < tick_period:
+                # Sleep rather than spin, so the drawing thread gets the interpreter.
+                self.waitForBots(last_game_update + tick_period)
+                continue
+            try:
+                with self.sim_lock:
+                    self.runSimCalls()
+                    if not self.is_simulating:
+                        last_game_update = new_time
+                        continue
+                    ScriptLoader.instance.simulation_tick()
+                    ScreenObjectManager.instance.recordPoses()
+                    self.pollResults()
+                    ScreenObjectManager.instance.publishSnapshot()
+                    if fast_forwarding:
+                        last_game_update = new_time
+                    elif new_time - last_game_update > self.MAX_CATCHUP_TICKS * tick_period:
+                        # Too far behind to catch up, so drop the time instead.
+                        total_lag_ticks += 1
+                        last_game_update = new_time
+                    else:
+                        last_game_update += tick_period
+                    if (
+                        ScriptLoader.instance.current_tick > 10
+                        and total_lag_ticks / ScriptLoader.instance.current_tick > 0.5
+                    ) and not lag_printed:
+                        lag_printed = True
+                        print("The simulation is currently lagging, you may want to turn down the game tick rate.")
             except WorkspaceError:
                 pass
+            except Exception as e:
+                self.sim_error = e
+                return
 
 
 def initialiseFromConfig(config, send_queues, recv_queues):
@@ -452,12 +949,14 @@ def initialiseFromConfig(config, send_queues, recv_queues):
         initialise_bot(config, robot_path, f"Robot-{index}", robot_paths[robot_path])
         robot_paths[robot_path] += 1
         ScriptLoader.instance.setRobotQueues(f"Robot-{index}", send_queues[index], recv_queues[index])
+    ScriptLoader.instance.compileMindstorms()
     for opt in config.get("interactors", []):
         try:
             ScriptLoader.instance.addActiveScript(fromOptions(opt))
         except Exception as exc:
             print(f"Failed to load interactor with the following options: {opt}. Got error: {exc}")
     SettingsManager.instance.setMany(config["settings"])
+    World.instance.applyPhysicsProfile()
     if ScriptLoader.instance.active_scripts:
         ScriptLoader.instance.startUp()
         ScriptLoader.instance.loadElements(config.get("elements", []))
@@ -466,5 +965,12 @@ def initialiseFromConfig(config, send_queues, recv_queues):
                 interactor.connectDevices()
         for interactor in ScriptLoader.instance.active_scripts:
             interactor.startUp()
+        if ScriptLoader.RECORD_REPLAYS and ScriptLoader.instance.robots:
+            ScriptLoader.instance.startRecording()
+        report = World.instance.tuneSpatialIndex()
+        print(
+            f"Physics broadphase: {report['index']}, {report['shapes']} shapes, "
+            f"{report['mean_overlaps']:.1f} overlaps and {report['mean_query_us']:.1f}us per query"
+        )
     else:
         print("No interactors successfully loaded. Quitting...")
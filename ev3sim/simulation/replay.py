@@ -0,0 +1,204 @@
+import json
+import struct
+import zlib
+
+MAGIC = b"EV3SIMR1"
+
+# Record types. Poses, fills, removals and tick markers are fixed size; keys, strings and events carry a length.
+RECORD_TICK = 0
+RECORD_KEY = 1
+RECORD_REMOVE = 2
+RECORD_POSE = 3
+RECORD_FILL = 4
+RECORD_STRING = 5
+RECORD_EVENT = 6
+
+TICK_FORMAT = struct.Struct("<BI")
+KEY_FORMAT = struct.Struct("<BHI")
+REMOVE_FORMAT = struct.Struct("<BH")
+POSE_FORMAT = struct.Struct("<BHfff")
+FILL_FORMAT = struct.Struct("<BHB4B")
+STRING_FORMAT = struct.Struct("<BHBI")
+EVENT_FORMAT = struct.Struct("<BI")
+CHUNK_FORMAT = struct.Struct("<BI")
+HEADER_FORMAT = struct.Struct("<I")
+
+# The visual attributes recorded as strings when they change.
+STRING_FIELDS = ["text", "image_path"]
+
+
+def _encodeJson(value):
+    return json.dumps(value, default=lambda o: o.tolist() if hasattr(o, "tolist") else list(o)).encode("utf-8")
+
+
+class ReplayRecorder:
+    """
+    Writes the visible state of a simulation to an append-only binary file, so it can be watched again without running
+    physics or bots.
+
+    Each tick only stores what changed: the poses, fills and texts of visuals, visuals appearing and disappearing, and
+    events sent to bots. Records are buffered and written in chunks of ``CHUNK_TICKS`` ticks, each compressed on its own
+    so that a file cut short is still readable up to its last chunk.
+    """
+
+    CHUNK_TICKS = 300
+
+    def __init__(self, path, header, compress=True):
+        self.compress = compress
+        self.file = open(path, "wb")
+        header = _encodeJson(header)
+        self.file.write(MAGIC + HEADER_FORMAT.pack(len(header)) + header)
+        self.file.flush()
+        self.buffer = bytearray()
+        self.buffered_ticks = 0
+        self.indices = {}
+        # Indices of removed visuals, reused so that they stay small.
+        self.free_indices = []
+        self.last_state = {}
+        self.pending_events = []
+
+    def recordEvent(self, robot_id, event_name, event_data):
+        self.pending_events.append([robot_id, event_name, event_data])
+
+    def recordTick(self, tick, visuals):
+        """
+        Store the state after `tick`.
+
+        :param dict visuals: Visual elements by key.
+        """
+        buffer = self.buffer
+        buffer += TICK_FORMAT.pack(RECORD_TICK, tick)
+        for key in list(self.indices):
+            if key not in visuals:
+                index = self.indices.pop(key)
+                self.free_indices.append(index)
+                buffer += REMOVE_FORMAT.pack(RECORD_REMOVE, index)
+                del self.last_state[key]
+        for key, visual in visuals.items():
+            if key not in self.indices:
+                options = getattr(visual, "factory_options", None)
+                if options is None:
+                    continue
+                index = self.free_indices.pop() if self.free_indices else len(self.indices)
+                self.indices[key] = index
+                self.last_state[key] = [None, None, {}]
+                data = _encodeJson({"key": key, "options": options})
+                buffer += KEY_FORMAT.pack(RECORD_KEY, index, len(data)) + data
+            index = self.indices[key]
+            state = self.last_state[key]
+            pose = (visual.position[0], visual.position[1], visual.rotation)
+            if pose != state[0]:
+                state[0] = pose
+                buffer += POSE_FORMAT.pack(RECORD_POSE, index, *pose)
+            fill = getattr(visual, "fill", None)
+            if fill != state[1]:
+                state[1] = fill
+                rgba = tuple(int(c) for c in fill) + (255,) * (4 - len(fill)) if fill is not None else (0, 0, 0, 0)
+                buffer += FILL_FORMAT.pack(RECORD_FILL, index, fill is not None, *rgba)
+            for field_index, field in enumerate(STRING_FIELDS):
+                value = getattr(visual, field, None)
+                if isinstance(value, str) and value != state[2].get(field):
+                    state[2][field] = value
+                    data = value.encode("utf-8")
+                    buffer += STRING_FORMAT.pack(RECORD_STRING, index, field_index, len(data)) + data
+        for event in self.pending_events:
+            data = _encodeJson(event)
+            buffer += EVENT_FORMAT.pack(RECORD_EVENT, len(data)) + data
+        self.pending_events = []
+        self.buffered_ticks += 1
+        if self.buffered_ticks >= self.CHUNK_TICKS:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = zlib.compress(bytes(self.buffer)) if self.compress else bytes(self.buffer)
+        self.file.write(CHUNK_FORMAT.pack(self.compress, len(data)) + data)
+        self.file.flush()
+        self.buffer = bytearray()
+        self.buffered_ticks = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class ReplayReader:
+    """Reads a file written by :class:`ReplayRecorder`, one tick at a time."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        if not self.data.startswith(MAGIC):
+            raise ValueError(f"{path} is not an ev3sim replay.")
+        offset = len(MAGIC)
+        (length,) = HEADER_FORMAT.unpack_from(self.data, offset)
+        offset += HEADER_FORMAT.size
+        self.header = json.loads(self.data[offset : offset + length])
+        self.chunks_offset = offset + length
+
+    def chunks(self):
+        offset = self.chunks_offset
+        while offset + CHUNK_FORMAT.size <= len(self.data):
+            compressed, length = CHUNK_FORMAT.unpack_from(self.data, offset)
+            offset += CHUNK_FORMAT.size
+            if offset + length > len(self.data):
+                # The recording was cut short part way through this chunk.
+                return
+            chunk = self.data[offset : offset + length]
+            offset += length
+            yield zlib.decompress(chunk) if compressed else chunk
+
+    def ticks(self):
+        """
+        Yields ``(tick, records)`` for every recorded tick. Each record is a tuple starting with its record type:
+
+        * ``(RECORD_KEY, index, key, options)``
+        * ``(RECORD_REMOVE, index)``
+        * ``(RECORD_POSE, index, x, y, rotation)``
+        * ``(RECORD_FILL, index, fill)``, where ``fill`` may be None
+        * ``(RECORD_STRING, index, field, value)``
+        * ``(RECORD_EVENT, robot_id, event_name, event_data)``
+        """
+        tick, records = None, []
+        for chunk in self.chunks():
+            offset = 0
+            while offset < len(chunk):
+                record_type = chunk[offset]
+                if record_type == RECORD_TICK:
+                    if tick is not None:
+                        yield tick, records
+                    _, tick = TICK_FORMAT.unpack_from(chunk, offset)
+                    records = []
+                    offset += TICK_FORMAT.size
+                elif record_type == RECORD_KEY:
+                    _, index, length = KEY_FORMAT.unpack_from(chunk, offset)
+                    offset += KEY_FORMAT.size
+                    data = json.loads(chunk[offset : offset + length])
+                    offset += length
+                    records.append((RECORD_KEY, index, data["key"], data["options"]))
+                elif record_type == RECORD_REMOVE:
+                    records.append(REMOVE_FORMAT.unpack_from(chunk, offset))
+                    offset += REMOVE_FORMAT.size
+                elif record_type == RECORD_POSE:
+                    records.append(POSE_FORMAT.unpack_from(chunk, offset))
+                    offset += POSE_FORMAT.size
+                elif record_type == RECORD_FILL:
+                    _, index, has_fill, *rgba = FILL_FORMAT.unpack_from(chunk, offset)
+                    offset += FILL_FORMAT.size
+                    records.append((RECORD_FILL, index, tuple(rgba) if has_fill else None))
+                elif record_type == RECORD_STRING:
+                    _, index, field_index, length = STRING_FORMAT.unpack_from(chunk, offset)
+                    offset += STRING_FORMAT.size
+                    value = chunk[offset : offset + length].decode("utf-8")
+                    offset += length
+                    records.append((RECORD_STRING, index, STRING_FIELDS[field_index], value))
+                elif record_type == RECORD_EVENT:
+                    _, length = EVENT_FORMAT.unpack_from(chunk, offset)
+                    offset += EVENT_FORMAT.size
+                    records.append((RECORD_EVENT, *json.loads(chunk[offset : offset + length])))
+                    offset += length
+                else:
+                    raise ValueError(f"Unknown replay record type {record_type}")
+        if tick is not None:
+            yield tick, records
@@ -0,0 +1,59 @@
+import math
+from collections import deque
+
+
+class RewindBuffer:
+    """
+    Remembers the last few seconds of the simulation, so earlier ticks can be shown again without re-simulating.
+
+    Every ``KEYFRAME_INTERVAL`` ticks a keyframe stores the pose of every visual. The ticks in between only store the
+    poses that changed. Whole keyframe groups are dropped once they are more than
+    ``SECONDS`` old, which keeps memory bounded.
+    """
+
+    SECONDS = 0
+    KEYFRAME_INTERVAL = 30
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Each group is (keyframe tick, poses, [changed poses for each following tick]).
+        self.groups = deque()
+        self.last_poses = {}
+
+    def record(self, tick, tick_rate, visuals):
+        """
+        Store the state after `tick`.
+
+        :param dict visuals: Visual elements by key.
+        """
+        if self.SECONDS <= 0:
+            return
+        poses = {key: (visual.position[0], visual.position[1], visual.rotation) for key, visual in visuals.items()}
+        if not self.groups or tick - self.groups[-1][0] >= self.KEYFRAME_INTERVAL:
+            self.groups.append((tick, poses, []))
+            max_groups = math.ceil(self.SECONDS * tick_rate / self.KEYFRAME_INTERVAL) + 1
+            while len(self.groups) > max_groups:
+                self.groups.popleft()
+        else:
+            self.groups[-1][2].append({key: pose for key, pose in poses.items() if self.last_poses.get(key) != pose})
+        self.last_poses = poses
+
+    @property
+    def oldestTick(self):
+        return self.groups[0][0] if self.groups else None
+
+    @property
+    def newestTick(self):
+        return self.groups[-1][0] + len(self.groups[-1][2]) if self.groups else None
+
+    def posesAt(self, tick):
+        """Rebuilds the pose of every visual at `tick`, or returns None if that tick is no longer remembered."""
+        for group_tick, keyframe, deltas in reversed(self.groups):
+            if group_tick <= tick:
+                poses = dict(keyframe)
+                for delta in deltas[: tick - group_tick]:
+                    poses.update(delta)
+                return poses
+        return None
@@ -1,3 +1,5 @@
+import time
+import numpy as np
 import pymunk
 import pymunk.pygame_util
 
@@ -22,15 +24,99 @@ class World:
     paused = False
     spawn_no = 0
 
+    # Solver settings for each named physics profile.
+    # iterations: Solver iterations per step. substeps: Physics steps taken per simulation tick.
+    # spatial_hash: Whether to use a spatial hash rather than the default bounding box tree (True, False, or "auto").
+    PHYSICS_PROFILES = {
+        "default": {"iterations": 10, "substeps": 1, "spatial_hash": "auto"},
+        "fast": {"iterations": 5, "substeps": 1, "spatial_hash": True},
+        "accurate": {"iterations": 20, "substeps": 4, "spatial_hash": "auto"},
+    }
+    PHYSICS_PROFILE = "default"
+    # Threaded solving is not available on Windows, and is ignored there.
+    THREADED_PHYSICS = False
+    PHYSICS_THREADS = 2
+    # A spatial hash is only chosen automatically for many shapes of similar size.
+    SPATIAL_HASH_MIN_SHAPES = 200
+    # Maximum ratio between the 90th and 10th percentile of shape sizes.
+    SPATIAL_HASH_MAX_SIZE_RATIO = 4
+    SPATIAL_HASH_CELLS_PER_SHAPE = 10
+
+    substeps = 1
+    broadphase_report = None
+
     def __init__(self):
         World.instance = self
         self.resetWorld()
 
     def resetWorld(self):
-        self.space = pymunk.Space()
-        self.space.gravity = 0, 0
         self.objects = []
         self.spawn_no += 1
+        self.applyPhysicsProfile()
+
+    def createSpace(self):
+        space = pymunk.Space(threaded=self.THREADED_PHYSICS)
+        if space.threaded:
+            space.threads = self.PHYSICS_THREADS
+        space.gravity = 0, 0
+        return space
+
+    def applyPhysicsProfile(self):
+        """Rebuilds the space with the current physics profile. This should be done before any objects are registered."""
+        if self.objects:
+            raise RuntimeError("Physics profiles must be applied before objects are registered.")
+        if self.PHYSICS_PROFILE not in self.PHYSICS_PROFILES:
+            raise ValueError(f"Unknown physics profile {self.PHYSICS_PROFILE}")
+        profile = self.PHYSICS_PROFILES[self.PHYSICS_PROFILE]
+        self.space = self.createSpace()
+        self.space.iterations = profile["iterations"]
+        self.substeps = profile["substeps"]
+
+    def tuneSpatialIndex(self):
+        """
+        Chooses the broadphase index from the bounding boxes of all loaded shapes. This should be done once all elements are loaded.
+
+        The bounding box tree copes best with few shapes or shapes of varying size, while a spatial hash with cells roughly
+        the size of an average shape is faster for large grids of similarly sized shapes, such as rescue tiles.
+        """
+        shapes = self.space.shapes
+        use_hash = False
+        if shapes:
+            sizes = np.array([max(bb.right - bb.left, bb.top - bb.bottom) for bb in (s.cache_bb() for s in shapes)])
+            low, high = np.percentile(sizes, [10, 90])
+            mode = self.PHYSICS_PROFILES[self.PHYSICS_PROFILE]["spatial_hash"]
+            if mode == "auto":
+                use_hash = (
+                    len(shapes) >= self.SPATIAL_HASH_MIN_SHAPES
+                    and low > 0
+                    and high / low <= self.SPATIAL_HASH_MAX_SIZE_RATIO
+                )
+            else:
+                use_hash = mode
+        if use_hash:
+            dim = max(float(np.median(sizes)), 1)
+            count = self.SPATIAL_HASH_CELLS_PER_SHAPE * len(shapes)
+            self.space.use_spatial_hash(dim, count)
+            index = f"spatial hash ({dim:.1f}cm cells, {count} buckets)"
+        else:
+            index = "bounding box tree"
+        self.broadphase_report = self.measureBroadphase(index)
+        return self.broadphase_report
+
+    def measureBroadphase(self, index):
+        """Queries the bounding box of every shape against the space, and reports the average cost."""
+        shapes = self.space.shapes
+        overlaps = 0
+        start = time.perf_counter()
+        for shape in shapes:
+            overlaps += len(self.space.bb_query(shape.bb, pymunk.ShapeFilter()))
+        elapsed = time.perf_counter() - start
+        return {
+            "index": index,
+            "shapes": len(shapes),
+            "mean_overlaps": overlaps / len(shapes) if shapes else 0,
+            "mean_query_us": elapsed / len(shapes) * 1e6 if shapes else 0,
+        }
 
     def registerObject(self, obj):
         self.objects.append(obj)
@@ -42,7 +128,8 @@ class World:
 
     @stop_on_pause
     def physics_tick(self, dt):
-        self.space.step(dt)
+        for _ in range(self.substeps):
+            self.space.step(dt / self.substeps)
 
     def tick(self, dt):
         self.physics_tick(dt)
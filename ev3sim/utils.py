@@ -1,33 +1,66 @@
 import multiprocessing
 from multiprocessing.queues import Queue as BaseQueue
+from queue import Empty
 
 
 class Queue(BaseQueue):
     """
     Multiprocessing queue that has a stable qsize value, and supports these methods for OSX.
     Also taken from https://github.com/vterron/lemon/commit/9ca6b4b1212228dbd4f69b88aaf88b12952d7d6f
+
+    The size is only locked while being changed, and only once for a whole batch with `put_many` and `get_all`, so
+    checking it is cheap. `put_count` and `get_count` count the items put and got by this process.
     """
 
+    put_count = 0
+    get_count = 0
+
     def __init__(self, *args, **kwargs):
-        self._internal_size = multiprocessing.Value("i", 0)
         if "ctx" not in kwargs:
             kwargs["ctx"] = multiprocessing.get_context()
+        self._internal_size = kwargs["ctx"].Value("i", 0)
         super().__init__(*args, **kwargs)
 
-    def put(self, *args, **kwargs):
+    def _change_size(self, amount):
         with self._internal_size.get_lock():
-            self._internal_size.value += 1
+            self._internal_size.value += amount
+
+    def put(self, *args, **kwargs):
+        self._change_size(1)
         super().put(*args, **kwargs)
+        self.put_count += 1
+
+    def put_many(self, items):
+        self._change_size(len(items))
+        for item in items:
+            super().put(item)
+        self.put_count += len(items)
 
     def get(self, *args, **kwargs):
         res = super().get(*args, **kwargs)
         # Ensure the size only decrements once the element has been gained.
-        with self._internal_size.get_lock():
-            self._internal_size.value -= 1
+        self._change_size(-1)
+        self.get_count += 1
         return res
 
+    def get_all(self):
+        """Returns everything that can be read without blocking, oldest first."""
+        if not self.qsize():
+            return []
+        items = []
+        while True:
+            try:
+                items.append(super().get(False))
+            except Empty:
+                break
+        if items:
+            self._change_size(-len(items))
+            self.get_count += len(items)
+        return items
+
     def qsize(self):
-        return self._internal_size.value
+        # Reading doesn't need the lock.
+        return self._internal_size.get_obj().value
 
     def empty(self):
         return not self.qsize()
@@ -45,6 +78,14 @@ def recursive_merge(dict1, dict2):
             dict1[key] = dict2[key]
 
 
+def wait_for_queues(queues, timeout):
+    """Blocks until one of `queues` has something to read or `timeout` seconds have passed, and returns the ready queues."""
+    from multiprocessing.connection import wait
+
+    readers = {q._reader: q for q in queues}
+    return [readers[reader] for reader in wait(list(readers), timeout)]
+
+
 def _latest_version(q, i):
     from ev3sim import __version__
     import requests
@@ -6,6 +6,10 @@ from ev3sim.search_locations import theme_locations
 import pygame
 import pygame.freetype
 import yaml
+import copy
+import threading
+import time
+import numpy as np
 from typing import Dict, List, Tuple
 
 import ev3sim.visual.utils as utils
@@ -32,6 +36,10 @@ class ScreenObjectManager:
     MAP_WIDTH: float = 200
     MAP_HEIGHT: float = 200
     BACKGROUND_COLOUR = "#1f1f1f"
+    # Draw moving visuals between their last two tick poses, rather than snapping to the latest one.
+    INTERPOLATE_POSES = False
+    # Moves longer than this between ticks are taken as teleports, and drawn without interpolation.
+    INTERPOLATION_MAX_JUMP = 20
 
     _background_colour: Tuple[int]
 
@@ -47,12 +55,78 @@ class ScreenObjectManager:
         self.sorting_order = []
         self.kill_keys = []
         self.screen_stack = []
+        self.ui_calls = []
+        self.snapshot = None
+        self.snapshot_wanted = True
+        self.sensorScreen = None
+        # Poses from the rewind buffer to draw instead of the current ones, while scrubbing.
+        self.rewind_poses = None
+        self.resetPoses()
         self.initFromKwargs(**kwargs)
 
     def resetVisualElements(self):
         self.sorting_order = []
         self.objects = {}
         self.kill_keys = []
+        self.snapshot = None
+        self.rewind_poses = None
+        self.resetPoses()
+
+    def resetPoses(self):
+        self.previous_poses = {}
+        self.current_poses = {}
+        self.pose_time = 0
+
+    def runOnMainThread(self, func, *args, **kwargs):
+        """Calls `func` now if on the main thread, otherwise defers it until the next round of event handling."""
+        if threading.current_thread() is threading.main_thread():
+            func(*args, **kwargs)
+        else:
+            self.ui_calls.append((func, args, kwargs))
+
+    def publishSnapshot(self):
+        """Captures the visuals as they stand, so they can be drawn while the simulation carries on ticking."""
+        if not self.snapshot_wanted:
+            return
+        self.snapshot = [(key, copy.copy(self.objects[key])) for key in self.sorting_order]
+        self.snapshot_poses = (self.previous_poses, self.current_poses, self.pose_time)
+        self.snapshot_wanted = False
+
+    def recordPoses(self):
+        """Remembers the pose of every visual after a tick, so that frames drawn before the next tick can interpolate."""
+        if not self.INTERPOLATE_POSES:
+            return
+        self.previous_poses = self.current_poses
+        self.current_poses = {
+            key: (visual.position[0], visual.position[1], visual.rotation) for key, visual in self.objects.items()
+        }
+        self.pose_time = time.time()
+
+    def interpolatedVisual(self, key, visual, poses, alpha):
+        """Returns a copy of `visual` placed `alpha` of the way from its previous tick pose to its current one."""
+        previous, current, _ = poses
+        if key not in previous or key not in current or previous[key] == current[key]:
+            return visual
+        (x0, y0, r0), (x1, y1, r1) = previous[key], current[key]
+        if abs(x1 - x0) + abs(y1 - y0) > self.INTERPOLATION_MAX_JUMP:
+            return visual
+        # Turn the short way round.
+        rotation = r0 + ((r1 - r0 + np.pi) % (2 * np.pi) - np.pi) * alpha
+        return self.posedVisual(visual, (x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha, rotation))
+
+    def rewoundVisual(self, key, visual):
+        pose = self.rewind_poses.get(key)
+        if pose is None or pose == (visual.position[0], visual.position[1], visual.rotation):
+            return visual
+        return self.posedVisual(visual, pose)
+
+    def posedVisual(self, visual, pose):
+        """Returns a copy of `visual` moved to `pose`, leaving the original untouched."""
+        result = copy.copy(visual)
+        result._position = np.array(pose[:2])
+        result._rotation = pose[2]
+        result.calculatePoints()
+        return result
 
     def initFromKwargs(self, **kwargs):
         self.original_SCREEN_WIDTH = self.SCREEN_WIDTH
@@ -112,21 +186,24 @@ class ScreenObjectManager:
         self.screens[self.SCREEN_RESCUE_EDIT] = RescueMapEditMenu((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
 
     def pushScreen(self, screenString, **kwargs):
-        if len(self.screen_stack) == 0 and screenString == self.SCREEN_SIM:
-            from ev3sim.simulation.loader import StateHandler
+        from ev3sim.simulation.loader import StateHandler
 
+        if len(self.screen_stack) == 0 and screenString == self.SCREEN_SIM:
             StateHandler.instance.is_running = True
         self.screen_stack.append(screenString)
         if hasattr(self.screens[screenString], "ui_theme"):
             self.screens[screenString].ui_theme.load_theme(self.theme_path)
-        self.screens[screenString].initWithKwargs(**kwargs)
+        # Screens set up and tear down simulations, so they wait for the current tick.
+        with StateHandler.instance.sim_lock:
+            self.screens[screenString].initWithKwargs(**kwargs)
 
     def popScreen(self):
-        self.screens[self.screen_stack[-1]].onPop()
+        from ev3sim.simulation.loader import StateHandler
+
+        with StateHandler.instance.sim_lock:
+            self.screens[self.screen_stack[-1]].onPop()
         self.screen_stack.pop()
         if len(self.screen_stack) == 0:
-            from ev3sim.simulation.loader import StateHandler
-
             StateHandler.instance.is_running = False
         else:
             self.screens[self.screen_stack[-1]].regenerateObjects()
@@ -221,44 +298,73 @@ class ScreenObjectManager:
             self.registerObject(child, child.key)
 
     def applyToScreen(self, to_screen=None, bg=None):
-        from ev3sim.simulation.loader import ScriptLoader
+        from ev3sim.simulation.loader import ScriptLoader, StateHandler
 
         blit_screen = self.screen if to_screen is None else to_screen
 
         blit_screen.fill(self.background_colour if bg is None else bg)
 
-        to_remove = []
-        for x in range(len(self.kill_keys)):
-            self.kill_keys[x][1] -= 1 / ScriptLoader.instance.VISUAL_TICK_RATE
-            if self.kill_keys[x][1] < 0:
-                self.unregisterVisual(self.kill_keys[x][0])
-                to_remove.append(x)
-        for x in to_remove[::-1]:
-            del self.kill_keys[x]
+        StateHandler.instance.runOnSimThread(self.expireVisuals, 1 / ScriptLoader.instance.VISUAL_TICK_RATE)
+        with StateHandler.instance.sim_lock:
+            if self.snapshot is not None and to_screen is None:
+                # Decoupled rendering: draw the last published state, and ask for a new one.
+                visuals = self.snapshot
+                poses = self.snapshot_poses
+                self.snapshot_wanted = True
+            else:
+                visuals = [(key, self.objects[key]) for key in self.sorting_order]
+                poses = (self.previous_poses, self.current_poses, self.pose_time)
+            if self.rewind_poses is not None and to_screen is None:
+                visuals = [(key, self.rewoundVisual(key, visual)) for key, visual in visuals]
 
         if to_screen is None:
             # `.update` can call `applyToScreen`
             self.screens[self.screen_stack[-1]].update(1 / ScriptLoader.instance.VISUAL_TICK_RATE)
         if self.screen_stack[-1] == self.SCREEN_SIM or to_screen is not None:
-            for key in self.sorting_order:
-                if self.objects[key].sensorVisible:
-                    self.objects[key].applyToScreen(blit_screen)
-            self.sensorScreen = self.screen.copy()
-            blit_screen.fill(self.background_colour if bg is None else bg)
-            for key in self.sorting_order:
-                self.objects[key].applyToScreen(blit_screen)
+            # Sensors see the surface from renderSensorScreen, so interpolation only changes what is drawn.
+            interpolate = self.INTERPOLATE_POSES and to_screen is None
+            if interpolate:
+                tick_period = 1 / ScriptLoader.instance.GAME_TICK_RATE / ScriptLoader.instance.TIME_SCALE
+                alpha = min(max((time.time() - poses[2]) / tick_period, 0), 1)
+            for key, visual in visuals:
+                if interpolate:
+                    visual = self.interpolatedVisual(key, visual, poses, alpha)
+                visual.applyToScreen(blit_screen)
         if to_screen is None:
             # `.draw_ui` can call `applyToScreen`
             self.screens[self.screen_stack[-1]].draw_ui(blit_screen)
         if to_screen is None:
             pygame.display.update()
 
+    def expireVisuals(self, elapsed):
+        to_remove = []
+        for x in range(len(self.kill_keys)):
+            self.kill_keys[x][1] -= elapsed
+            if self.kill_keys[x][1] < 0:
+                self.unregisterVisual(self.kill_keys[x][0])
+                to_remove.append(x)
+        for x in to_remove[::-1]:
+            del self.kill_keys[x]
+
+    def renderSensorScreen(self):
+        """Draws the visuals sensors can see onto their own surface, every tick, whether or not a frame is drawn."""
+        size = (self._SCREEN_WIDTH_ACTUAL, self._SCREEN_HEIGHT_ACTUAL)
+        if self.sensorScreen is None or self.sensorScreen.get_size() != size:
+            self.sensorScreen = pygame.Surface(size)
+        self.sensorScreen.fill(self.background_colour)
+        for key in self.sorting_order:
+            if self.objects[key].sensorVisible:
+                self.objects[key].applyToScreen(self.sensorScreen)
+
     def colourAtPixel(self, screen_position):
         return self.sensorScreen.get_at(screen_position)
 
     def handleEvents(self):
         from ev3sim.simulation.loader import StateHandler, ScriptLoader
 
+        ui_calls, self.ui_calls = self.ui_calls, []
+        for func, args, kwargs in ui_calls:
+            func(*args, **kwargs)
         events = list(pygame.event.get()) + self.unhandled_events
         self.unhandled_events = []
         for event in events:
@@ -392,6 +498,7 @@ screen_settings = {
         "MAP_WIDTH",
         "MAP_HEIGHT",
         "BACKGROUND_COLOUR",
+        "INTERPOLATE_POSES",
     ]
 }
 
@@ -4,6 +4,8 @@ import pygame_gui
 from pygame_gui.core.ui_element import ObjectID
 from ev3sim.visual.menus.base_menu import BaseMenu
 from ev3sim.simulation.loader import ScriptLoader, StateHandler
+from ev3sim.simulation.rewind import RewindBuffer
+from ev3sim.visual.manager import ScreenObjectManager
 
 
 class SimulatorMenu(BaseMenu):
@@ -17,6 +19,9 @@ class SimulatorMenu(BaseMenu):
 
     ERROR_COLOUR = "#d90429"
 
+    # Pressing F fast forwards to the next goal or completed tile, but never further than this.
+    FAST_FORWARD_LIMIT_SECONDS = 180
+
     def initWithKwargs(self, **kwargs):
         batch = kwargs.get("batch")
         from ev3sim.simulation.world import World
@@ -27,10 +32,14 @@ class SimulatorMenu(BaseMenu):
         self.current_edit = 0
 
         self.messages = []
+        # How many ticks behind the live simulation the scrub bar is showing.
+        self.rewind_offset = 0
         StateHandler.instance.beginSimulation(batch=batch)
         super().initWithKwargs(**kwargs)
 
     def onPop(self):
+        # Stop scrubbing, which would otherwise leave the world paused.
+        self.scrubTo(0)
         # We need to close all previous communications with the bots.
         StateHandler.instance.closeProcesses()
         StateHandler.instance.is_simulating = False
@@ -47,7 +56,7 @@ class SimulatorMenu(BaseMenu):
 
     def postInput(self, msg):
         self.console_input.set_text("")
-        ScriptLoader.instance.postInput(msg)
+        StateHandler.instance.runOnSimThread(ScriptLoader.instance.postInput, msg)
 
     def regenerateObjects(self):
         super().regenerateObjects()
@@ -58,6 +67,17 @@ class SimulatorMenu(BaseMenu):
     def generateObjects(self):
         draw_input = len(ScriptLoader.instance.input_requests) > 0
 
+        if RewindBuffer.SECONDS > 0:
+            max_ticks = int(RewindBuffer.SECONDS * ScriptLoader.instance.GAME_TICK_RATE)
+            self.rewind_slider = pygame_gui.elements.UIHorizontalSlider(
+                relative_rect=pygame.Rect(self._size[0] * 0.25, self._size[1] - 35, self._size[0] * 0.5, 25),
+                start_value=-self.rewind_offset,
+                value_range=(-max_ticks, 0),
+                manager=self,
+                object_id=ObjectID("rewind-slider"),
+            )
+            self._all_objs.append(self.rewind_slider)
+
         self.gen_messages = []
         current_y = 0
         for i, (_, __, msg) in enumerate(self.messages):
@@ -186,18 +206,55 @@ class SimulatorMenu(BaseMenu):
                 interactor.draw_ui(window_surface)
         super().draw_ui(window_surface)
 
+    def scrubTo(self, offset):
+        """Shows the simulation as it was `offset` ticks ago, pausing it while doing so. An offset of 0 returns to live."""
+        from ev3sim.simulation.world import World
+
+        rewind = ScriptLoader.instance.rewind
+        manager = ScreenObjectManager.instance
+        if offset <= 0 or rewind.newestTick is None:
+            if manager.rewind_poses is not None:
+                World.instance.paused = self.paused_before_rewind
+            manager.rewind_poses = None
+            self.rewind_offset = 0
+            return
+        if manager.rewind_poses is None:
+            self.paused_before_rewind = World.instance.paused
+            World.instance.paused = True
+        tick = max(rewind.oldestTick, rewind.newestTick - offset)
+        manager.rewind_poses = rewind.posesAt(tick)
+        self.rewind_offset = rewind.newestTick - tick
+
+    def toggleFastForward(self):
+        from ev3sim.events import GOAL_SCORED
+        from ev3sim.simulation.fast_forward import UntilAny, UntilEvent, UntilTick, UntilTileCompleted
+
+        if ScriptLoader.instance.fast_forward is not None:
+            ScriptLoader.instance.stopFastForward()
+            return
+        ScriptLoader.instance.fastForward(
+            UntilAny(
+                UntilEvent(GOAL_SCORED),
+                UntilTileCompleted(),
+                UntilTick(self.FAST_FORWARD_LIMIT_SECONDS * ScriptLoader.instance.GAME_TICK_RATE),
+            )
+        )
+
     def handleEvent(self, event):
+        # Don't steal keys from the console input.
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_f and len(ScriptLoader.instance.input_requests) == 0:
+            StateHandler.instance.runOnSimThread(self.toggleFastForward)
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_c and len(ScriptLoader.instance.input_requests) == 0:
+            StateHandler.instance.runOnSimThread(ScriptLoader.instance.printBotStats)
         if hasattr(event, "link_target"):
             if event.link_target.startswith("restart"):
-                from ev3sim.simulation.loader import ScriptLoader
-
                 robot_index = int(event.link_target.split("-")[1])
                 for i in range(len(self.messages)):
                     if not self.messages[i][0] and self.messages[i][1] == robot_index:
                         del self.messages[i]
                         break
                 self.regenerateObjects()
-                ScriptLoader.instance.startProcess(f"Robot-{robot_index}")
+                StateHandler.instance.runOnSimThread(ScriptLoader.instance.startProcess, f"Robot-{robot_index}")
             elif event.link_target.startswith("logs"):
                 robot_index = int(event.link_target.split("-")[1])
                 Logger.instance.openLog(f"Robot-{robot_index}")
@@ -209,6 +266,9 @@ class SimulatorMenu(BaseMenu):
         if event.type == pygame.USEREVENT and event.user_type == pygame_gui.UI_TEXT_ENTRY_FINISHED:
             # Post input.
             self.postInput(event.text)
+        if event.type == pygame.USEREVENT and event.user_type == pygame_gui.UI_HORIZONTAL_SLIDER_MOVED:
+            if event.ui_element == getattr(self, "rewind_slider", None):
+                StateHandler.instance.runOnSimThread(self.scrubTo, -int(event.value))
         for interactor in ScriptLoader.instance.active_scripts:
             if hasattr(interactor, "process_events"):
                 res = res or interactor.process_events(event)
@@ -446,11 +446,14 @@ class Polygon(Colorable):
             tmp = self.rotation, self.position
         except:
             return
-        for i, v in enumerate(self.verts):
-            self.points[i] = utils.worldspace_to_screenspace(
+        # Build a fresh list rather than writing in place, so snapshots taken for drawing are left untouched.
+        self.points = [
+            utils.worldspace_to_screenspace(
                 local_space_to_world_space(v, self.rotation, self.position),
                 self.customMap,
             )
+            for v in self.verts
+        ]
 
     def _applyToScreen(self, screen):
         if self.fill:
@@ -768,6 +771,8 @@ def visualFactory(**options):
     for klass in (Polygon, Rectangle, Circle, Arc, Text, Image):
         if options["name"] == klass.__name__:
             r = klass(**options)
+            # Kept so the element can be recreated, for example when playing back a replay.
+            r.factory_options = options
             return r
     name = options["name"]
     raise ValueError(f"Unknown visual element, {name}")
@@ -0,0 +1,77 @@
+from ev3sim.constants import *
+from ev3sim.simulation.bot_comms import BotCommService
+from ev3sim.simulation.loader import ScriptLoader
+
+
+class Outbox(list):
+    def put(self, item):
+        self.append(item)
+
+    def put_many(self, items):
+        self.extend(items)
+
+
+def setup_bots(*robot_ids):
+    ScriptLoader()
+    outboxes = {robot_id: Outbox() for robot_id in robot_ids}
+    for robot_id, outbox in outboxes.items():
+        ScriptLoader.instance.setRobotQueues(robot_id, outbox, None)
+    return outboxes
+
+
+def test_messages_are_routed_by_connection():
+    outboxes = setup_bots("Robot-0", "Robot-1", "Robot-2")
+    comms = BotCommService()
+    comms.attemptConnectToServer("Robot-1", "aa:1234")
+    comms.startServer("aa:1234", "Robot-0")
+    comms.attemptConnectToServer("Robot-2", "aa:1234")
+    assert outboxes["Robot-1"][0] == (
+        SUCCESS_CLIENT_CONNECTION,
+        {"host_id": "Robot-0", "connection_string": "aa:1234", "connection": 0},
+    )
+    assert outboxes["Robot-2"][0][1]["connection"] == 1
+
+    comms.handleSend("Robot-2", 1, "hello", sent_tick=4, current_tick=5)
+    assert outboxes["Robot-0"][-1] == (RECV_DATA, {"connection": 1, "data": "hello"})
+    assert outboxes["Robot-2"][-1] == (SEND_SUCCESS, {"connection": 1})
+    assert comms.connections[1].messages == 1 and comms.connections[1].max_latency == 1
+
+
+def test_sending_on_a_closed_connection_fails():
+    outboxes = setup_bots("Robot-0", "Robot-1")
+    comms = BotCommService()
+    comms.startServer("aa:1234", "Robot-0")
+    comms.attemptConnectToServer("Robot-1", "aa:1234")
+    comms.closeClient(0, "Robot-1")
+    assert outboxes["Robot-1"][-1] == (CLIENT_CLOSED, {"connection": 0})
+    comms.handleSend("Robot-0", 0, "hello", sent_tick=0, current_tick=0)
+    assert "error" in outboxes["Robot-0"][-1][1]
+
+
+def test_links_limit_latency_bandwidth_and_queue(monkeypatch):
+    monkeypatch.setattr(BotCommService, "LINK_LATENCY_TICKS", 2)
+    monkeypatch.setattr(BotCommService, "LINK_BYTES_PER_TICK", 10)
+    monkeypatch.setattr(BotCommService, "LINK_QUEUE_LIMIT", 2)
+    outboxes = setup_bots("Robot-0", "Robot-1")
+    comms = BotCommService()
+    comms.startServer("aa:1234", "Robot-0")
+    comms.attemptConnectToServer("Robot-1", "aa:1234")
+    del outboxes["Robot-0"][:], outboxes["Robot-1"][:]
+
+    for message in ("12345", "67890", "abcdefghijklmno"):
+        comms.handleSend("Robot-1", 0, message, sent_tick=0, current_tick=0)
+    # The third message doesn't fit in the link yet, so isn't acknowledged.
+    assert outboxes["Robot-1"] == [(SEND_SUCCESS, {"connection": 0})] * 2
+    assert comms.connections[0].backlog == 3
+
+    comms.tick(1)
+    assert outboxes["Robot-0"] == []
+    comms.tick(2)
+    assert [data["data"] for _, data in outboxes["Robot-0"]] == ["12345", "67890"]
+    assert len(outboxes["Robot-1"]) == 3
+    # 15 bytes takes two ticks at 10 bytes per tick, and latency starts when the message got onto the link.
+    comms.tick(4)
+    assert len(outboxes["Robot-0"]) == 2
+    comms.tick(5)
+    assert outboxes["Robot-0"][-1][1]["data"] == "abcdefghijklmno"
+    assert comms.connections[0].bytes == 25 and comms.connections[0].max_latency == 5
@@ -0,0 +1,29 @@
+import pytest
+
+from ev3sim.simulation.bot_cpu import BotCpuUsage
+
+
+def test_start_up_is_not_counted():
+    usage = BotCpuUsage()
+    usage.report(0.5)
+    assert usage.allowTick(0.001)
+    usage.report(0.5005)
+    assert usage.allowTick(0.001)
+    assert usage.total == pytest.approx(0.0005)
+
+
+def test_over_budget_ticks_are_held_back():
+    usage = BotCpuUsage()
+    usage.report(0)
+    usage.report(0.0025)
+    # 2.5ms used with a 1ms budget, so the bot waits until that has been paid off.
+    assert [usage.allowTick(0.001) for _ in range(5)] == [False, False, False, True, True]
+    assert usage.delayed_ticks == 3
+    assert usage.perTick == pytest.approx(0.0005)
+
+
+def test_no_budget():
+    usage = BotCpuUsage()
+    usage.report(0)
+    usage.report(1)
+    assert usage.allowTick(0)
@@ -0,0 +1,103 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from ev3sim.simulation.bot_thread import BotPatches, ThreadQueue
+
+
+def test_patches_only_apply_on_the_bots_thread(monkeypatch):
+    module = types.ModuleType("fake_helpers")
+    module.robot_id = "Robot-0"
+    module.name = lambda: "original"
+    monkeypatch.setitem(sys.modules, "fake_helpers", module)
+    patches = BotPatches()
+    seen = {}
+    bound = threading.Event()
+    finish = threading.Event()
+
+    def bot():
+        with patches.apply(
+            [("fake_helpers", "robot_id", "Robot-3"), ("fake_helpers", "name", lambda: "bot")], stubbed_modules={}
+        ):
+            from fake_helpers import robot_id
+
+            seen["bot"] = (robot_id, module.name())
+            bound.set()
+            finish.wait()
+
+    thread = threading.Thread(target=bot)
+    thread.start()
+    bound.wait()
+    seen["main"] = (module.robot_id, module.name())
+    finish.set()
+    thread.join()
+    assert seen == {"bot": ("Robot-3", "bot"), "main": ("Robot-0", "original")}
+    # Once no bots are bound, the module is back to how it was.
+    assert module.__dict__["name"]() == "original" and "robot_id" not in type(module).__dict__
+
+
+def test_class_method_patches(monkeypatch):
+    module = types.ModuleType("fake_helpers")
+
+    class EventSystem:
+        @classmethod
+        def handle_events(cls):
+            return ("original", cls)
+
+    module.EventSystem = EventSystem
+    original = EventSystem.__dict__["handle_events"]
+    monkeypatch.setitem(sys.modules, "fake_helpers", module)
+
+    class BotEvents(EventSystem):
+        pass
+
+    @classmethod
+    def handle_events(cls):
+        return ("bot", cls)
+
+    patches = BotPatches()
+    seen = {}
+
+    def bot():
+        with patches.apply([("fake_helpers", "EventSystem.handle_events", handle_events)], stubbed_modules={}):
+            seen["bot"] = BotEvents.handle_events()
+
+    thread = threading.Thread(target=bot)
+    thread.start()
+    thread.join()
+    assert seen["bot"] == ("bot", BotEvents)
+    assert EventSystem.handle_events() == ("original", EventSystem)
+    assert EventSystem.__dict__["handle_events"] is original
+
+
+def test_patches_are_undone(monkeypatch):
+    module = types.ModuleType("fake_helpers")
+    module.robot_id = "Robot-0"
+    monkeypatch.setitem(sys.modules, "fake_helpers", module)
+    stub = types.ModuleType("fake_stub")
+    patches = BotPatches()
+    with patches.apply([("fake_helpers", "robot_id", "Robot-3")], stubbed_modules={"fake_stub": stub}):
+        assert sys.modules["fake_stub"] is stub and type(module) is not types.ModuleType
+    assert "fake_stub" not in sys.modules and type(module) is types.ModuleType
+
+
+def test_unsupported_patch(monkeypatch):
+    module = types.ModuleType("fake_helpers")
+    module.Settings = type("Settings", (), {"size": 1})
+    monkeypatch.setitem(sys.modules, "fake_helpers", module)
+    patches = BotPatches()
+    with pytest.raises(TypeError):
+        with patches.apply([("fake_helpers", "Settings.size", 2)], stubbed_modules={}):
+            pass
+    assert module.Settings.size == 1 and not patches.restore
+
+
+def test_thread_queue():
+    queue = ThreadQueue()
+    queue.put(1)
+    queue.put_many([2, 3])
+    assert queue.qsize() == 3 and queue.get_nowait() == 1
+    assert queue.get_all() == [2, 3] and queue.empty()
+    assert (queue.put_count, queue.get_count) == (3, 3)
@@ -0,0 +1,97 @@
+import os
+import sys
+import types
+from concurrent.futures import Future
+
+from ev3sim.simulation import code_cache, loader
+from ev3sim.simulation.bot_thread import ThreadQueue
+from ev3sim.simulation.code_cache import compile_mindstorms, load_code, mindstorms_path
+from ev3sim.simulation.loader import ScriptLoader
+
+
+def run(code):
+    namespace = {}
+    exec(code, namespace)
+    return namespace["x"]
+
+
+def test_code_is_cached_until_the_source_changes(tmp_path, monkeypatch):
+    script = tmp_path / "code.py"
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    script.write_text("x = 1\n")
+    assert run(load_code(str(script), str(cache_dir))) == 1
+    (cache_file,) = os.listdir(cache_dir)
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("Should have used the cache.")
+
+    with monkeypatch.context() as m:
+        m.setattr(code_cache, "compile", no_compile, raising=False)
+        assert run(load_code(str(script), str(cache_dir))) == 1
+
+    script.write_text("x = 2\n")
+    assert run(load_code(str(script), str(cache_dir))) == 2
+    assert os.listdir(cache_dir) == [cache_file]
+
+
+def test_mindstorms_projects_are_compiled_once_per_version(tmp_path, monkeypatch):
+    compiled_from = []
+
+    def from_ev3(project, ev3sim_support):
+        with open(project) as f:
+            compiled_from.append(f.read())
+        return f"x = {compiled_from[-1]!r}\n"
+
+    mindpile = types.ModuleType("mindpile")
+    mindpile.from_ev3 = from_ev3
+    monkeypatch.setitem(sys.modules, "mindpile", mindpile)
+    project = tmp_path / "program.ev3"
+    project.write_text("one")
+    cache_dir = str(tmp_path)
+
+    first = compile_mindstorms(str(project), cache_dir)
+    assert compile_mindstorms(str(project), cache_dir) == first
+    project.write_text("two")
+    second = compile_mindstorms(str(project), cache_dir)
+    assert compiled_from == ["one", "two"]
+    assert run(load_code(first)) == "one" and run(load_code(second)) == "two"
+
+
+def test_failed_mindstorms_compilation_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "mindpile", None)
+    project = tmp_path / "program.ev3"
+    project.write_text("one")
+    compiled = compile_mindstorms(str(project), str(tmp_path))
+    assert compiled.endswith(".failed.py")
+    assert not os.path.exists(mindstorms_path(str(project), str(tmp_path)))
+
+
+def test_batches_compile_without_waiting(tmp_path, monkeypatch):
+    monkeypatch.setattr(loader, "cache_directory", lambda name: str(tmp_path))
+    project = tmp_path / "program.ev3"
+    project.write_text("one")
+    ScriptLoader()
+    ScriptLoader.instance.scriptnames = {"Robot-0": str(project), "Robot-1": None}
+    ScriptLoader.instance.compileMindstorms()
+    # mindpile isn't installed here, so this is the failed compilation.
+    assert ScriptLoader.instance.compiling[str(project)].result(timeout=60).endswith(".failed.py")
+
+
+def test_bots_wait_for_their_project(tmp_path, monkeypatch):
+    project = str(tmp_path / "program.ev3")
+    ScriptLoader()
+    ScriptLoader.instance.scriptnames = {"Robot-0": project}
+    ScriptLoader.instance.queues = {"Robot-0": (ThreadQueue(), ThreadQueue())}
+    compiling = ScriptLoader.instance.compiling[project] = Future()
+    ScriptLoader.instance.startProcess("Robot-0")
+    assert ScriptLoader.instance.waiting_for_compile == {"Robot-0"}
+    assert ScriptLoader.instance.processes.get("Robot-0") is None
+
+    started = []
+    monkeypatch.setattr(ScriptLoader, "startProcess", lambda self, robot_id: started.append(robot_id))
+    ScriptLoader.instance.pollCompiles()
+    assert started == []
+    compiling.set_result(str(tmp_path / "compiled.py"))
+    ScriptLoader.instance.pollCompiles()
+    assert started == ["Robot-0"] and not ScriptLoader.instance.waiting_for_compile
@@ -0,0 +1,22 @@
+from ev3sim.events import GOAL_SCORED
+from ev3sim.simulation.fast_forward import UntilAny, UntilEvent, UntilPrint, UntilTick, UntilTileCompleted
+
+
+def test_until_tick_counts_from_start():
+    condition = UntilTick(3)
+    assert [condition.onTick(tick) for tick in range(100, 103)] == [False, False, True]
+
+
+def test_until_print_matches_pattern():
+    condition = UntilPrint(r"distance \d+")
+    assert not condition.onPrint("Robot-0", "starting up")
+    assert condition.onPrint("Robot-0", "distance 42")
+
+
+def test_until_any():
+    condition = UntilAny(UntilEvent(GOAL_SCORED), UntilTileCompleted(), UntilTick(2))
+    assert not condition.onEvent("Robot-0", "on_reset", {})
+    assert condition.onEvent("Robot-1", GOAL_SCORED, {"against_you": False})
+    assert condition.onTileCompleted(3)
+    assert not condition.onTick(0)
+    assert condition.onTick(1)
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from ev3sim.objects.base import objectFactory
+from ev3sim.simulation.fork import forkSimulation
+from ev3sim.simulation.loader import ScriptLoader
+from ev3sim.simulation.replay import ReplayReader, ReplayRecorder
+from ev3sim.simulation.world import World
+from ev3sim.visual.manager import ScreenObjectManager
+
+
+@pytest.fixture
+def ball():
+    ScreenObjectManager()
+    ScriptLoader()
+    ScriptLoader.instance.startUp()
+    World()
+    obj = objectFactory(physics=True, key="ball", visual={"name": "Circle", "radius": 2})
+    World.instance.registerObject(obj)
+    obj.body.velocity = (30, 0)
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    return obj
+
+
+def turn(obj, velocity):
+    def variant(tick):
+        obj.body.velocity = velocity
+
+    return variant
+
+
+def test_fork_variants_start_from_current_state(ball):
+    results = forkSimulation(
+        [turn(ball, (30, 0)), turn(ball, (0, 30))],
+        30,
+        lambda: (tuple(ball.body.position), ScriptLoader.instance.current_tick),
+    )
+    assert results[0][0] == pytest.approx((31, 0))
+    assert results[1][0] == pytest.approx((1, 30))
+    assert results[0][1] == results[1][1] == 31
+    # The original simulation is untouched.
+    assert tuple(ball.body.position) == pytest.approx((1, 0))
+
+
+def test_fork_leaves_recordings_alone(ball, tmp_path):
+    path = str(tmp_path / "match.ev3rec")
+    recorder = ScriptLoader.instance.recorder = ReplayRecorder(path, {"tick_rate": 30})
+    recorder.CHUNK_TICKS = 2
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    size = os.path.getsize(path)
+    history = ScriptLoader.instance.rewind.newestTick
+
+    def count_history():
+        return ScriptLoader.instance.recorder, ScriptLoader.instance.rewind.newestTick
+
+    assert forkSimulation([turn(ball, (0, 30))], 10, count_history) == [(None, None)]
+    assert os.path.getsize(path) == size
+    assert ScriptLoader.instance.rewind.newestTick == history
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    ScriptLoader.instance.stopRecording()
+    assert [tick for tick, _ in ReplayReader(path).ticks()] == [2, 3]
+
+
+def test_failed_variant(ball):
+    def fail(tick):
+        raise KeyError("left")
+
+    with pytest.raises(RuntimeError, match="Variant 1 failed"):
+        forkSimulation([turn(ball, (0, 30)), fail], 5, lambda: None)
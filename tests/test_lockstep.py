@@ -0,0 +1,147 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ev3sim.constants import *
+from ev3sim.simulation.bot_cpu import BotCpuUsage
+from ev3sim.simulation.loader import ScriptLoader
+from ev3sim.simulation.world import World
+from ev3sim.utils import Queue
+from ev3sim.visual.manager import ScreenObjectManager
+from ev3sim.visual.objects import visualFactory
+from ev3sim.visual.utils import worldspace_to_screenspace
+
+
+class FakeBot(threading.Thread):
+    """Takes the bot's side of lockstep like attach_bot does, running `on_tick` with each tick it is sent."""
+
+    def __init__(self, robot_id, on_tick):
+        super().__init__()
+        self.robot_id = robot_id
+        self.on_tick = on_tick
+        self.recv_q, self.send_q = Queue(), Queue()
+        self.read = 0
+        self.device_data = dict
+        self.seen = []
+
+    def receive(self):
+        message = self.recv_q.get()
+        self.read += 1
+        return message
+
+    def finished(self, tick):
+        return (TICK_FINISHED, {"robot_id": self.robot_id, "tick": tick, "cpu_time": 0, "read": self.read})
+
+    def run(self):
+        while True:
+            msg_type, msg = self.receive()
+            if msg_type is None:
+                return
+            if msg_type == SIM_DATA:
+                self.seen.append(msg["data"])
+                self.on_tick(self, msg["tick"])
+
+
+@pytest.fixture
+def bots():
+    bots = []
+    yield bots
+    for bot in bots:
+        bot.recv_q.put((None, None))
+        bot.join()
+
+
+def setup_bots(bots, *new_bots):
+    bots.extend(new_bots)
+    ScriptLoader()
+    ScriptLoader.instance.startUp()
+    for bot in new_bots:
+        ScriptLoader.instance.robots[bot.robot_id] = SimpleNamespace(
+            spawned=True, _interactor=SimpleNamespace(collectDeviceData=bot.device_data)
+        )
+        ScriptLoader.instance.outstanding_events[bot.robot_id] = []
+        ScriptLoader.instance.cpu_usage[bot.robot_id] = BotCpuUsage()
+        ScriptLoader.instance.setRobotQueues(bot.robot_id, bot.recv_q, bot.send_q)
+        ScriptLoader.instance.processes[bot.robot_id] = bot
+        bot.start()
+
+
+def test_bots_take_turns(bots):
+    log = []
+
+    def server(bot, tick):
+        log.append((bot.robot_id, "tick", tick))
+        # Reporting before the simulator's reply arrives mustn't end the turn.
+        bot.send_q.put_many(
+            [(START_SERVER, {"robot_id": bot.robot_id, "connection_string": f"aa:{tick}"}), bot.finished(tick)]
+        )
+        assert bot.receive()[0] == SERVER_SUCCESS
+        time.sleep(0.05)
+        log.append((bot.robot_id, "reply", tick))
+        bot.send_q.put(bot.finished(tick))
+
+    def idle(bot, tick):
+        log.append((bot.robot_id, "tick", tick))
+        bot.send_q.put(bot.finished(tick))
+
+    setup_bots(bots, FakeBot("Robot-1", idle), FakeBot("Robot-0", server))
+    for tick in (1, 2):
+        ScriptLoader.instance.physics_tick = tick
+        ScriptLoader.instance.lockstepBots()
+    assert log == [
+        ("Robot-0", "tick", 1),
+        ("Robot-0", "reply", 1),
+        ("Robot-1", "tick", 1),
+        ("Robot-0", "tick", 2),
+        ("Robot-0", "reply", 2),
+        ("Robot-1", "tick", 2),
+    ]
+
+
+def test_slow_bot_is_skipped(bots, monkeypatch):
+    monkeypatch.setattr(ScriptLoader, "LOCKSTEP_TIMEOUT", 0.2)
+    messages = []
+    monkeypatch.setattr(ScriptLoader, "printSystemMessage", lambda self, message: messages.append(message))
+    log = []
+
+    def slow(bot, tick):
+        time.sleep(1)
+        bot.send_q.put(bot.finished(tick))
+
+    def idle(bot, tick):
+        log.append((bot.robot_id, tick))
+        bot.send_q.put(bot.finished(tick))
+
+    slow_bot = FakeBot("Robot-0", slow)
+    setup_bots(bots, slow_bot, FakeBot("Robot-1", idle))
+    ScriptLoader.instance.physics_tick = 1
+    start = time.time()
+    ScriptLoader.instance.lockstepBots()
+    assert time.time() - start < 1
+    assert messages == ["Robot-0 took more than 0.2s over a tick, skipping it."]
+    assert log == [("Robot-1", 1)]
+    # The slow bot is still told its turn is over, for when it next waits.
+    assert slow_bot.recv_q.qsize() == 1
+
+
+def test_turns_see_the_sensors_of_their_tick(bots, monkeypatch):
+    monkeypatch.setattr(ScriptLoader, "LOCKSTEP_BOTS", True)
+    man = ScreenObjectManager()
+    man.background_colour = "#000000"
+    tile = visualFactory(name="Rectangle", width=20, height=20, fill="#ff0000", sensorVisible=True)
+    man.registerVisual(tile, "tile")
+
+    def idle(bot, tick):
+        bot.send_q.put(bot.finished(tick))
+
+    bot = FakeBot("Robot-0", idle)
+    bot.device_data = lambda: {"colour": tuple(man.colourAtPixel(worldspace_to_screenspace((0, 0))))}
+    setup_bots(bots, bot)
+    World()
+    # No frames are drawn, the readings only depend on the ticks.
+    ScriptLoader.instance.simulation_tick()
+    tile.position = (40, 0)
+    ScriptLoader.instance.simulation_tick()
+    assert bot.seen == [{"colour": (255, 0, 0, 255)}, {"colour": (0, 0, 0, 255)}]
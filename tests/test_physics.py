@@ -0,0 +1,89 @@
+import pytest
+
+from ev3sim.objects.base import objectFactory
+from ev3sim.simulation.world import World
+
+
+def spawn_ball(friction):
+    World()
+    obj = objectFactory(physics=True, key="ball", visual={"name": "Circle", "radius": 2}, friction=friction)
+    World.instance.registerObject(obj)
+    return obj
+
+
+def test_friction_matches_per_tick_damping():
+    obj = spawn_ball(0.9)
+    obj.body.velocity = (10, 0)
+    obj.body.angular_velocity = 2
+    World.instance.tick(1 / 30)
+    assert obj.body.velocity.x == pytest.approx(9)
+    assert obj.body.angular_velocity == pytest.approx(1.8)
+
+
+def test_friction_independent_of_tick_rate():
+    obj = spawn_ball(0.9)
+    obj.body.velocity = (10, 0)
+    for _ in range(4):
+        World.instance.tick(1 / 120)
+    assert obj.body.velocity.x == pytest.approx(9)
+
+
+def test_accurate_profile_substeps():
+    World.PHYSICS_PROFILE = "accurate"
+    try:
+        World()
+        World.instance.applyPhysicsProfile()
+        assert World.instance.substeps == 4
+        assert World.instance.space.iterations == 20
+    finally:
+        World.PHYSICS_PROFILE = "default"
+
+
+def test_unknown_profile():
+    World()
+    World.PHYSICS_PROFILE = "unknown"
+    try:
+        with pytest.raises(ValueError):
+            World.instance.applyPhysicsProfile()
+    finally:
+        World.PHYSICS_PROFILE = "default"
+
+
+def test_reset_keeps_profile():
+    World.PHYSICS_PROFILE = "accurate"
+    try:
+        World()
+        World.instance.resetWorld()
+        assert World.instance.substeps == 4
+        assert World.instance.space.iterations == 20
+    finally:
+        World.PHYSICS_PROFILE = "default"
+
+
+def test_profile_after_objects_registered():
+    spawn_ball(1)
+    with pytest.raises(RuntimeError):
+        World.instance.applyPhysicsProfile()
+
+
+def test_spatial_hash_for_uniform_grid():
+    World()
+    World.instance.applyPhysicsProfile()
+    for x in range(15):
+        for y in range(15):
+            obj = objectFactory(
+                physics=True,
+                static=True,
+                key=f"tile-{x}-{y}",
+                visual={"name": "Rectangle", "width": 5, "height": 5},
+                position=(x * 6, y * 6),
+            )
+            World.instance.registerObject(obj)
+    report = World.instance.tuneSpatialIndex()
+    assert report["index"].startswith("spatial hash")
+    assert report["shapes"] == 225
+
+
+def test_tree_for_few_shapes():
+    spawn_ball(1)
+    assert World.instance.tuneSpatialIndex()["index"] == "bounding box tree"
@@ -0,0 +1,19 @@
+import time
+
+from ev3sim.utils import Queue
+
+
+def test_counting_queue_batches():
+    q = Queue()
+    q.put_many([1, 2, 3])
+    q.put(4)
+    assert q.qsize() == 4
+    assert q.get(timeout=1) == 1
+    items = []
+    deadline = time.time() + 2
+    while len(items) < 3 and time.time() < deadline:
+        items.extend(q.get_all())
+    assert items == [2, 3, 4]
+    assert q.qsize() == 0 and q.empty()
+    assert q.get_all() == []
+    assert (q.put_count, q.get_count) == (4, 4)
@@ -0,0 +1,80 @@
+from ev3sim.simulation.replay import (
+    RECORD_EVENT,
+    RECORD_FILL,
+    RECORD_KEY,
+    RECORD_POSE,
+    RECORD_REMOVE,
+    RECORD_STRING,
+    ReplayReader,
+    ReplayRecorder,
+)
+from ev3sim.visual.objects import visualFactory
+
+
+def test_replay_round_trip(tmp_path):
+    path = str(tmp_path / "match.ev3rec")
+    recorder = ReplayRecorder(path, {"tick_rate": 30})
+    recorder.CHUNK_TICKS = 2
+    box = visualFactory(name="Rectangle", width=2, height=2, fill="#ff0000")
+    label = visualFactory(name="Rectangle", width=1, height=1)
+    label.text = "0 - 0"
+    recorder.recordTick(1, {"box": box, "label": label})
+    box.position = (5, 0)
+    label.text = "1 - 0"
+    recorder.recordEvent("Robot-0", "on_goal_scored", {"against_you": False})
+    recorder.recordTick(2, {"box": box, "label": label})
+    recorder.recordTick(3, {"label": label})
+    recorder.close()
+
+    reader = ReplayReader(path)
+    assert reader.header == {"tick_rate": 30}
+    ticks = list(reader.ticks())
+    assert [tick for tick, _ in ticks] == [1, 2, 3]
+    first = ticks[0][1]
+    assert (RECORD_KEY, 0, "box", box.factory_options) in first
+    assert (RECORD_FILL, 0, (255, 0, 0, 255)) in first
+    assert ticks[1][1] == [
+        (RECORD_POSE, 0, 5, 0, 0),
+        (RECORD_STRING, 1, "text", "1 - 0"),
+        (RECORD_EVENT, "Robot-0", "on_goal_scored", {"against_you": False}),
+    ]
+    assert ticks[2][1] == [(RECORD_REMOVE, 0)]
+
+
+def test_truncated_replay_reads_complete_chunks(tmp_path):
+    path = str(tmp_path / "match.ev3rec")
+    recorder = ReplayRecorder(path, {})
+    recorder.CHUNK_TICKS = 1
+    box = visualFactory(name="Rectangle", width=2, height=2)
+    for tick in range(3):
+        box.position = (tick, 0)
+        recorder.recordTick(tick, {"box": box})
+    recorder.close()
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-3])
+    assert [tick for tick, _ in ReplayReader(path).ticks()] == [0, 1]
+
+
+def test_paused_ticks_not_recorded(tmp_path):
+    from ev3sim.simulation.loader import ScriptLoader
+    from ev3sim.simulation.world import World
+    from ev3sim.visual.manager import ScreenObjectManager
+
+    ScreenObjectManager()
+    ScriptLoader()
+    ScriptLoader.instance.startUp()
+    World()
+    path = str(tmp_path / "match.ev3rec")
+    ScriptLoader.instance.recorder = ReplayRecorder(path, {"tick_rate": 30})
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    World.instance.paused = True
+    try:
+        for _ in range(5):
+            ScriptLoader.instance.simulation_tick(bot_io=False)
+    finally:
+        World.instance.paused = False
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    ScriptLoader.instance.stopRecording()
+    assert [tick for tick, _ in ReplayReader(path).ticks()] == [1, 2]
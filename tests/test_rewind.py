@@ -0,0 +1,57 @@
+from ev3sim.simulation.rewind import RewindBuffer
+from ev3sim.visual.objects import visualFactory
+
+
+def record_moving_box(buffer, ticks):
+    visual = visualFactory(name="Rectangle", width=2, height=2)
+    wall = visualFactory(name="Rectangle", width=2, height=2)
+    for tick in range(ticks):
+        visual.position = (tick, 0)
+        buffer.record(tick, 30, {"box": visual, "wall": wall})
+
+
+def test_poses_rebuilt_from_keyframes_and_deltas():
+    buffer = RewindBuffer()
+    buffer.SECONDS = 10
+    buffer.KEYFRAME_INTERVAL = 4
+    record_moving_box(buffer, 11)
+    assert buffer.oldestTick == 0
+    assert buffer.newestTick == 10
+    assert buffer.posesAt(6)["box"] == (6, 0, 0)
+    assert buffer.posesAt(6)["wall"] == (0, 0, 0)
+    # Only the moving box is stored between keyframes.
+    assert buffer.groups[-1][2] == [{"box": (9, 0, 0)}, {"box": (10, 0, 0)}]
+
+
+def test_history_is_bounded():
+    buffer = RewindBuffer()
+    buffer.SECONDS = 1
+    buffer.KEYFRAME_INTERVAL = 10
+    record_moving_box(buffer, 300)
+    assert buffer.newestTick == 299
+    assert buffer.oldestTick == 260
+    assert buffer.posesAt(200) is None
+
+
+def test_paused_ticks_not_recorded():
+    from ev3sim.simulation.loader import ScriptLoader
+    from ev3sim.simulation.world import World
+    from ev3sim.visual.manager import ScreenObjectManager
+
+    ScreenObjectManager()
+    ScriptLoader()
+    ScriptLoader.instance.startUp()
+    World()
+    ScriptLoader.instance.rewind.SECONDS = 10
+    for _ in range(3):
+        ScriptLoader.instance.simulation_tick(bot_io=False)
+    World.instance.paused = True
+    try:
+        for _ in range(5):
+            ScriptLoader.instance.simulation_tick(bot_io=False)
+    finally:
+        World.instance.paused = False
+    assert ScriptLoader.instance.rewind.newestTick == 3
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    assert ScriptLoader.instance.rewind.newestTick == 4
+    assert ScriptLoader.instance.rewind.groups[-1][2] == [{}, {}, {}]
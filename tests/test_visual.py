@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from ev3sim.simulation.loader import ScriptLoader
+from ev3sim.simulation.world import World
+from ev3sim.visual.manager import ScreenObjectManager
+from ev3sim.visual.objects import visualFactory
+from ev3sim.visual.utils import worldspace_to_screenspace
+
+
+def test_interpolated_visual_between_ticks():
+    man = ScreenObjectManager()
+    visual = visualFactory(name="Rectangle", width=2, height=2)
+    man.registerVisual(visual, "box")
+    man.INTERPOLATE_POSES = True
+    man.recordPoses()
+    visual.position = (10, 0)
+    visual.rotation = np.pi / 2
+    man.recordPoses()
+    poses = (man.previous_poses, man.current_poses, man.pose_time)
+    halfway = man.interpolatedVisual("box", visual, poses, 0.5)
+    assert list(halfway.position) == pytest.approx([5, 0])
+    assert halfway.rotation == pytest.approx(np.pi / 4)
+    # The visual the simulation owns is untouched.
+    assert list(visual.position) == pytest.approx([10, 0])
+    assert halfway.points != visual.points
+
+
+def test_teleports_are_not_interpolated():
+    man = ScreenObjectManager()
+    visual = visualFactory(name="Rectangle", width=2, height=2)
+    man.registerVisual(visual, "box")
+    man.INTERPOLATE_POSES = True
+    man.recordPoses()
+    visual.position = (100, 0)
+    man.recordPoses()
+    poses = (man.previous_poses, man.current_poses, man.pose_time)
+    assert man.interpolatedVisual("box", visual, poses, 0.5) is visual
+
+
+def test_sensors_see_only_sensor_visible_visuals():
+    man = ScreenObjectManager()
+    man.background_colour = "#000000"
+    tile = visualFactory(name="Rectangle", width=20, height=20, fill="#ff0000", sensorVisible=True)
+    robot = visualFactory(name="Rectangle", width=20, height=20, fill="#00ff00", position=(40, 0))
+    man.registerVisual(tile, "tile")
+    man.registerVisual(robot, "robot")
+    man.renderSensorScreen()
+    assert tuple(man.colourAtPixel(worldspace_to_screenspace((0, 0)))) == (255, 0, 0, 255)
+    assert tuple(man.colourAtPixel(worldspace_to_screenspace((40, 0)))) == (0, 0, 0, 255)
+
+
+def test_sensors_follow_ticks_without_frames():
+    man = ScreenObjectManager()
+    man.background_colour = "#000000"
+    ScriptLoader()
+    ScriptLoader.instance.startUp()
+    World()
+    tile = visualFactory(name="Rectangle", width=20, height=20, fill="#ff0000", sensorVisible=True)
+    man.registerVisual(tile, "tile")
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    assert tuple(man.colourAtPixel(worldspace_to_screenspace((0, 0)))) == (255, 0, 0, 255)
+    tile.position = (40, 0)
+    ScriptLoader.instance.simulation_tick(bot_io=False)
+    assert tuple(man.colourAtPixel(worldspace_to_screenspace((40, 0)))) == (255, 0, 0, 255)
+    assert tuple(man.colourAtPixel(worldspace_to_screenspace((0, 0)))) == (0, 0, 0, 255)